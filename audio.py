@@ -0,0 +1,476 @@
+"""
+Audio-reactive control: band energies and onsets from a streaming FFT of a sound device or
+a WAV file, a beat clock locked to the detected tempo or to tapped beats, and a driver that
+turns them into desk changes, either pumping the intensity or keeping the chase on the beat.
+
+The FFT runs on numpy when it is installed and in pure Python otherwise. Analysis runs on
+its own thread, one block at a time, so it never holds up the output engine.
+
+    python audio.py show.wav
+"""
+import argparse
+import array
+import cmath
+import functools
+import logging
+import math
+import queue
+import sys
+import threading
+import time
+import wave
+
+from collections import deque
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import sounddevice  # only needed to listen to a sound device
+except ImportError:
+    sounddevice = None
+
+logger = logging.getLogger(__name__)
+
+# (name, lowest Hz, highest Hz)
+BANDS = (('bass', 40, 150), ('low mid', 150, 600), ('high mid', 600, 4000), ('high', 4000, 12000))
+MODES = ('intensity', 'chase')
+
+
+@functools.lru_cache()
+def _bit_reversal(size: int) -> list:
+    bits = size.bit_length() - 1
+    return [int('{:0{}b}'.format(i, bits)[::-1], 2) for i in range(size)]
+
+
+@functools.lru_cache()
+def _twiddles(size: int) -> list:
+    return [cmath.exp(-2j * math.pi * k / size) for k in range(size // 2)]
+
+
+@functools.lru_cache()
+def hann_window(size: int) -> list:
+    return [0.5 - 0.5 * math.cos(2 * math.pi * i / size) for i in range(size)]
+
+
+def fft(values: list) -> list:
+    """
+    Iterative radix-2 FFT in pure Python.
+    :param values: a power of two of real or complex samples
+    """
+    size = len(values)
+    out = [complex(values[i]) for i in _bit_reversal(size)]
+    span = 2
+    while span <= size:
+        half = span // 2
+        twiddles = _twiddles(span)
+        for start in range(0, size, span):
+            for k in range(half):
+                even = out[start + k]
+                odd = out[start + k + half] * twiddles[k]
+                out[start + k] = even + odd
+                out[start + k + half] = even - odd
+        span *= 2
+    return out
+
+
+def magnitudes(samples) -> list:
+    """
+    :param samples: a power of two of samples, -1.0 to 1.0
+    :return: the magnitude of every frequency bin up to half the sample rate, windowed
+    """
+    size = len(samples)
+    if numpy is not None:
+        return numpy.abs(numpy.fft.rfft(numpy.asarray(samples) * numpy.hanning(size + 1)[:size])) / size
+    window = hann_window(size)
+    spectrum = fft([sample * weight for sample, weight in zip(samples, window)])
+    return [abs(value) / size for value in spectrum[:size // 2 + 1]]
+
+
+def read_samples(data: bytes, sample_width: int, channels: int) -> list:
+    """
+    :return: the frames of little-endian PCM data mixed down to mono, -1.0 to 1.0
+    """
+    if sample_width == 1:
+        values = [value - 128 for value in data]
+        scale = 128
+    elif sample_width == 3:
+        values = [int.from_bytes(data[i:i + 3], 'little', signed=True) for i in range(0, len(data), 3)]
+        scale = 1 << 23
+    else:
+        values = array.array('h' if sample_width == 2 else 'i', data)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        scale = 1 << (8 * sample_width - 1)
+    if channels == 1:
+        return [value / scale for value in values]
+    scale *= channels
+    return [sum(values[i:i + channels]) / scale for i in range(0, len(values) - channels + 1, channels)]
+
+
+class WaveSource:
+    """
+    Blocks of samples from a WAV file, paced to the wall clock unless realtime is False.
+    """
+    def __init__(self, path: str, block_size: int = 512, realtime: bool = True):
+        self.path = path
+        self.block_size = block_size
+        self.realtime = realtime
+        with wave.open(path, 'rb') as wave_file:
+            self.sample_rate = wave_file.getframerate()
+
+    def __iter__(self):
+        """
+        :return: iterator of (time.perf_counter() the block is due, samples)
+        """
+        started = time.perf_counter()
+        position = 0
+        with wave.open(self.path, 'rb') as wave_file:
+            sample_width, channels = wave_file.getsampwidth(), wave_file.getnchannels()
+            while True:
+                data = wave_file.readframes(self.block_size)
+                if not data:
+                    return
+                samples = read_samples(data, sample_width, channels)
+                position += len(samples)
+                due = started + position / self.sample_rate
+                if self.realtime:
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                yield due, samples
+
+
+class DeviceSource:
+    """
+    Blocks of samples from a sound input device, through the optional sounddevice module.
+    Only the most recent blocks are kept, so a slow consumer skips audio instead of lagging.
+    """
+    def __init__(self, device=None, sample_rate: int = 44100, block_size: int = 512, max_blocks: int = 4):
+        if sounddevice is None:
+            raise ImportError("The sounddevice module is required to listen to a sound device")
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.blocks = queue.Queue(max_blocks)
+        self.stopped = threading.Event()
+        self.stream = sounddevice.InputStream(device=device, channels=1, samplerate=sample_rate,
+                                              blocksize=block_size, dtype='float32', callback=self._received)
+
+    def _received(self, data, frames, stream_time, status) -> None:
+        block = (time.perf_counter(), data[:, 0].tolist())
+        try:
+            self.blocks.put_nowait(block)
+        except queue.Full:
+            self.blocks.get_nowait()
+            self.blocks.put_nowait(block)
+
+    def __iter__(self):
+        self.stream.start()
+        try:
+            while not self.stopped.is_set():
+                try:
+                    yield self.blocks.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+        finally:
+            self.stream.stop()
+            self.stream.close()
+
+    def close(self) -> None:
+        self.stopped.set()
+
+
+class Analysis:
+    def __init__(self, time: float, bands: dict, flux: float, onset: bool, bpm: float):
+        """
+        :param time: seconds of audio analysed, up to the end of this block
+        :param bands: mean energy of every band of BANDS
+        :param flux: spectral flux, how much louder the bands got since the last block
+        :param onset: a note or drum hit starts in this block
+        :param bpm: the tempo of the recent onsets, or None while it is unknown
+        """
+        self.time = time
+        self.bands = bands
+        self.flux = flux
+        self.onset = onset
+        self.bpm = bpm
+
+
+class Analyser:
+    """
+    Streaming analysis, one block at a time: an FFT over the last fft_size samples gives the
+    band energies, and their spectral flux is how much the log energies rose since the last
+    block. A flux above its recent mean by sensitivity standard deviations is an onset. The
+    tempo comes from the gaps between recent onsets, folded into 80-160 BPM.
+    """
+    min_onset_gap = 0.1
+    min_bpm = 80
+    min_flux = 0.5
+    energy_floor = 1e-9
+
+    def __init__(self, sample_rate: int, block_size: int = 512, fft_size: int = 1024, bands=BANDS,
+                 sensitivity: float = 1.5, history: float = 1.0):
+        """
+        :param block_size: samples in every processed block
+        :param fft_size: a power of two, at least block_size
+        :param history: seconds of flux the onset threshold is worked out over
+        """
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.sensitivity = sensitivity
+        self.bins = {}
+        for name, low, high in bands:
+            first = max(int(low * fft_size / sample_rate), 1)
+            self.bins[name] = (first, max(int(high * fft_size / sample_rate), first) + 1)
+        self.samples = deque([0.0] * fft_size, maxlen=fft_size)
+        self.previous = None
+        self.fluxes = deque(maxlen=max(int(history * sample_rate / block_size), 8))
+        self.onsets = deque(maxlen=16)
+        self.position = 0
+
+    def process(self, samples: list) -> Analysis:
+        self.samples.extend(samples)
+        self.position += len(samples)
+        now = self.position / self.sample_rate
+        spectrum = magnitudes(list(self.samples))
+        bands = {name: float(sum(value * value for value in spectrum[low:high]) / (high - low))
+                 for name, (low, high) in self.bins.items()}
+        logs = [math.log(energy + self.energy_floor) for energy in bands.values()]
+        flux = 0.0 if self.previous is None else sum(max(log - previous, 0.0) for log, previous
+                                                     in zip(logs, self.previous))
+        self.previous = logs
+        onset = False
+        if len(self.fluxes) >= self.fluxes.maxlen // 2:
+            mean = sum(self.fluxes) / len(self.fluxes)
+            deviation = math.sqrt(sum((value - mean) ** 2 for value in self.fluxes) / len(self.fluxes))
+            onset = (flux > mean + self.sensitivity * deviation and flux > self.min_flux
+                     and (not self.onsets or now - self.onsets[-1] >= self.min_onset_gap))
+        self.fluxes.append(flux)
+        if onset:
+            self.onsets.append(now)
+        return Analysis(now, bands, flux, onset, self.bpm())
+
+    def bpm(self) -> float:
+        onsets = list(self.onsets)
+        gaps = sorted(fold_bpm(60 / (later - earlier), self.min_bpm) for earlier, later in zip(onsets, onsets[1:])
+                      if later - earlier >= 60 / (self.min_bpm * 4))
+        if len(gaps) < 3:
+            return None
+        # The median rejects stray onsets, the mean of the tempos near it smooths out the block size.
+        median = gaps[len(gaps) // 2]
+        near = [bpm for bpm in gaps if abs(bpm - median) <= median * 0.05]
+        return sum(near) / len(near)
+
+
+def fold_bpm(bpm: float, minimum: float = 80) -> float:
+    """
+    Double or halve a tempo into minimum to twice the minimum.
+    """
+    while bpm < minimum:
+        bpm *= 2
+    while bpm >= minimum * 2:
+        bpm /= 2
+    return bpm
+
+
+class TapTempo:
+    """
+    The tempo of beats tapped on a key: the mean gap of the recent taps, starting again
+    after a pause of more than reset seconds.
+    """
+    def __init__(self, reset: float = 2.0, taps: int = 8):
+        self.reset = reset
+        self.taps = deque(maxlen=taps)
+
+    def tap(self, now: float) -> float:
+        """
+        :return: the tapped tempo in BPM, or None after the first tap
+        """
+        if self.taps and now - self.taps[-1] > self.reset:
+            self.taps.clear()
+        self.taps.append(now)
+        return self.bpm
+
+    @property
+    def bpm(self) -> float:
+        if len(self.taps) < 2:
+            return None
+        return 60 * (len(self.taps) - 1) / (self.taps[-1] - self.taps[0])
+
+
+class BeatClock:
+    """
+    Predicts beats from a tempo and the time of one beat, and pulls its phase towards
+    onsets that land close to a predicted beat.
+    """
+    def __init__(self, lock_window: float = 0.2):
+        """
+        :param lock_window: fraction of a beat an onset may be off a beat and still correct it
+        """
+        self.lock_window = lock_window
+        self.period = None
+        self.next_beat = None
+
+    def set_tempo(self, bpm: float, beat: float) -> None:
+        """
+        :param beat: time of a beat, e.g. the last tap
+        """
+        self.period = 60 / bpm
+        self.next_beat = beat + self.period
+
+    def onset(self, now: float) -> None:
+        if self.period is None:
+            return
+        error = now - (self.next_beat - self.period)
+        if abs(error) < self.period * self.lock_window:
+            self.next_beat += error / 2
+
+    def due(self, now: float) -> bool:
+        """
+        :return: True once for every beat that has come since the last call
+        """
+        if self.next_beat is None or now < self.next_beat:
+            return False
+        while self.next_beat <= now:
+            self.next_beat += self.period
+        return True
+
+
+class AudioReactive:
+    """
+    Drives the desk from an audio source, or from tapped beats alone, on its own thread.
+
+    In 'intensity' mode an 'audio' sub-master over every desk channel follows the bass energy
+    and jumps to full on every beat. In 'chase' mode every beat retimes the running chase of
+    the cue playback to the tempo, so its steps land on the beats; it leaves the desk alone
+    while no chase plays, and releasing the playback stops it.
+    Tapped beats set the tempo ahead of the one heard in the audio.
+    """
+    beat_decay = 0.25
+    peak_decay = 0.999
+
+    def __init__(self, core, source=None, mode: str = 'intensity', fft_size: int = 1024):
+        """
+        :param core: the DeskCore to drive
+        :param source: a WaveSource, DeviceSource or any iterable of (time.perf_counter(), samples)
+            with a sample_rate and block_size; None to follow tapped beats only
+        :param mode: one of MODES
+        """
+        if mode not in MODES:
+            raise ValueError("Unknown audio mode {!r}".format(mode))
+        self.core = core
+        self.source = source
+        self.mode = mode
+        self.analyser = None if source is None else Analyser(source.sample_rate, source.block_size, fft_size)
+        self.tap_tempo = TapTempo()
+        self.clock = BeatClock()
+        self.peak = 1e-9
+        self.last_beat = None
+        self.level = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.run, name="AudioReactive", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if hasattr(self.source, 'close'):
+            self.source.close()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(1)
+        if self.mode == 'intensity':
+            self.set_intensity(255)
+
+    def tap(self, now: float = None) -> None:
+        now = time.perf_counter() if now is None else now
+        bpm = self.tap_tempo.tap(now)
+        if bpm is not None:
+            self.clock.set_tempo(bpm, now)
+            logger.info("Tapped tempo %.1f BPM", bpm)
+
+    def run(self) -> None:
+        if self.source is None:
+            while not self.stopped.wait(0.005):
+                self.step(time.perf_counter(), None)
+            return
+        for block_time, samples in self.source:
+            if self.stopped.is_set():
+                break
+            self.step(time.perf_counter(), self.analyser.process(samples))
+            # From the block arriving to its change reaching the output engine.
+            self.core.output.profiler.record('audio', time.perf_counter() - block_time)
+
+    def step(self, now: float, analysis: Analysis) -> None:
+        """
+        Follow one analysed block, or just the beat clock when there is no audio.
+        """
+        if analysis is not None and analysis.onset:
+            if analysis.bpm is not None and self.tap_tempo.bpm is None:
+                if self.clock.period is None or abs(60 / self.clock.period - analysis.bpm) > 1:
+                    self.clock.set_tempo(analysis.bpm, now)
+            self.clock.onset(now)
+        beat = self.clock.due(now)
+        if beat:
+            self.last_beat = now
+        if self.mode == 'chase':
+            if beat:
+                self.core.set_chase_tempo(60 / self.clock.period, now)
+            return
+        level = 0.0
+        if analysis is not None:
+            energy = analysis.bands.get('bass', 0.0)
+            self.peak = max(energy, self.peak * self.peak_decay)
+            level = energy / self.peak
+        if self.last_beat is not None:
+            level = max(level, math.exp(-(now - self.last_beat) / self.beat_decay))
+        self.set_intensity(round(min(level, 1.0) * 255))
+
+    def set_intensity(self, level: int) -> None:
+        if level != self.level:
+            self.level = level
+            self.core.set_submaster('audio', level, list(range(1, len(self.core.levels) + 1)))
+
+    def stats(self) -> dict:
+        latencies = sorted(self.core.output.profiler.durations('audio'))
+        return {'bpm': 60 / self.clock.period if self.clock.period else None,
+                'latency_p95_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+                'latency_max_ms': latencies[-1] * 1000 if latencies else None}
+
+
+def analyse_file(path: str, block_size: int = 512, fft_size: int = 1024, sensitivity: float = 1.5) -> dict:
+    """
+    Analyse a WAV file as fast as possible, e.g. to check the detection against a recording.
+    :return: {'onsets': [seconds], 'bpm', 'blocks', 'block_ms': mean analysis time of a block}
+    """
+    source = WaveSource(path, block_size, realtime=False)
+    analyser = Analyser(source.sample_rate, block_size, fft_size, sensitivity=sensitivity)
+    onsets = []
+    blocks = 0
+    bpm = None
+    started = time.perf_counter()
+    for _, samples in source:
+        analysis = analyser.process(samples)
+        blocks += 1
+        bpm = analysis.bpm or bpm
+        if analysis.onset:
+            onsets.append(analysis.time)
+    elapsed = time.perf_counter() - started
+    return {'onsets': onsets, 'bpm': bpm, 'blocks': blocks, 'block_ms': elapsed / max(blocks, 1) * 1000}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Detect the onsets and tempo of a WAV file")
+    parser.add_argument('path')
+    parser.add_argument('--block-size', type=int, default=512)
+    parser.add_argument('--fft-size', type=int, default=1024)
+    parser.add_argument('--sensitivity', type=float, default=1.5)
+    arguments = parser.parse_args()
+    result = analyse_file(arguments.path, arguments.block_size, arguments.fft_size, arguments.sensitivity)
+    print("{} onsets, {} BPM, {:.2f} ms per block of {} samples".format(
+        len(result['onsets']), 'unknown' if result['bpm'] is None else '{:.1f}'.format(result['bpm']),
+        result['block_ms'], arguments.block_size))
+    print(' '.join('{:.3f}'.format(onset) for onset in result['onsets']))
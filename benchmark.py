@@ -0,0 +1,203 @@
+"""
+Throughput and latency benchmarks for the DMX output path, run against loopback
+interfaces so no hardware is needed.
+
+    python benchmark.py --duration 3 --latency 0.0005 --universes 4
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+import pyUDMX
+from engine import OutputEngine
+from loopback import LoopbackTransport
+from output import UniverseManager
+from shared import OutputProcess, SharedUniverses
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def latency_summary(latencies: list) -> dict:
+    return {'p50_ms': percentile(latencies, 0.5) * 1000, 'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000, 'max_ms': max(latencies, default=0.0) * 1000}
+
+
+def transfer_benchmark(channels: int, multi_value: bool, latency: float, duration: float) -> dict:
+    """
+    Send whole frames straight to a device, either one SetSingleChannel transfer per channel
+    or one SetMultiChannel transfer per frame.
+    """
+    transport = LoopbackTransport(1, latency)
+    device = pyUDMX.uDMXDevice(transport)
+    device.open()
+    frame_times = []
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        frame = bytes(random.randrange(256) for _ in range(channels))
+        frame_started = time.perf_counter()
+        if multi_value:
+            device.send_multi_value(1, bytearray(frame))
+        else:
+            for channel, value in enumerate(frame, 1):
+                device.send_single_value(channel, value)
+        frame_times.append(time.perf_counter() - frame_started)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    loopback = transport.devices[0]
+    device.close()
+    result = {'scenario': 'transfer', 'mode': 'multi' if multi_value else 'single', 'channels': channels,
+              'universes': 1, 'frames_per_second': len(frame_times) / elapsed,
+              'transfers_per_frame': loopback.transfer_count / max(len(frame_times), 1),
+              'cpu_percent': cpu / elapsed * 100}
+    result.update(latency_summary(frame_times))
+    return result
+
+
+def engine_benchmark(channels: int, universes: int, latency: float, duration: float, frame_rate: float,
+                     failure_rate: float = 0.0) -> dict:
+    """
+    Publish changing frames into a running OutputEngine and time how long each value takes
+    to reach a loopback device.
+    """
+    transport = LoopbackTransport(universes, latency, failure_rate)
+    manager = UniverseManager(universes, transport=transport)
+    engine = OutputEngine(manager, frame_rate)
+    published = [dict() for _ in range(universes)]
+    stopped = threading.Event()
+
+    def publisher():
+        marker = 0
+        while not stopped.is_set():
+            marker = marker % 255 + 1
+            frame = bytes([marker]) + bytes(random.randrange(256) for _ in range(channels - 1))
+            for universe in range(universes):
+                published[universe][marker] = time.perf_counter()
+                engine.publish(1, frame, universe)
+            stopped.wait(random.uniform(0, 2 / frame_rate))
+
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    engine.start()
+    thread = threading.Thread(target=publisher, daemon=True)
+    thread.start()
+    time.sleep(duration)
+    # Taken while frames are still published, so they describe the run and not the idle engine after it.
+    stats = engine.stats()
+    stopped.set()
+    thread.join()
+    engine.stop()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    manager.close()
+    latencies = []
+    transfers = 0
+    for universe, device in enumerate(transport.devices):
+        transfers += device.transfer_count
+        for received, channel, data in device.transfers:
+            sent = published[universe].get(data[0]) if channel == 1 else None
+            if sent is not None and sent <= received:
+                latencies.append(received - sent)
+    result = {'scenario': 'engine', 'mode': 'multi', 'channels': channels, 'universes': universes,
+              'frames_per_second': stats['fps'], 'jitter_ms': stats['jitter'] * 1000,
+              'transfers_per_frame': transfers / max(engine.frames_sent, 1) / universes,
+              'cpu_percent': cpu / elapsed * 100}
+    result.update(latency_summary(latencies))
+    return result
+
+
+def load_benchmark(channels: int, universes: int, duration: float, frame_rate: float, output_process: bool) -> dict:
+    """
+    Run the output while another thread keeps the interpreter busy, as Tk redraws and effect
+    maths do, with the interfaces driven either by a thread of the same process or by an
+    OutputProcess reading shared memory.
+    """
+    if output_process:
+        manager = SharedUniverses(universes)
+        process = OutputProcess(manager, frame_rate, loopback_devices=universes)
+        process.start()
+    else:
+        manager = UniverseManager(universes, transport=LoopbackTransport(universes))
+    engine = OutputEngine(manager, frame_rate)
+    stopped = threading.Event()
+
+    def animate(now):
+        # Stands in for a running effect: a new frame for every universe on every tick.
+        for universe in range(universes):
+            engine.publish(1, bytes(random.randrange(256) for _ in range(channels)), universe)
+
+    def busy():
+        while not stopped.is_set():
+            sum(i * i for i in range(10000))
+
+    engine.add_frame_callback(animate)
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    engine.start()
+    thread = threading.Thread(target=busy, daemon=True)
+    thread.start()
+    time.sleep(duration)
+    stats = engine.stats()
+    stopped.set()
+    thread.join()
+    engine.stop()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    if output_process:
+        process.stop()
+        frames_per_second, jitter = stats['output_fps'], stats['output_jitter']
+    else:
+        frames_per_second, jitter = stats['fps'], stats['jitter']
+    manager.close()
+    return {'scenario': 'load', 'mode': 'process' if output_process else 'thread', 'channels': channels,
+            'universes': universes, 'frames_per_second': frames_per_second, 'jitter_ms': jitter * 1000,
+            'cpu_percent': cpu / elapsed * 100}
+
+
+def run(duration: float, latency: float, universes: int, frame_rate: float, failure_rate: float = 0.0) -> list:
+    results = []
+    for channels in (24, 512):
+        for multi_value in (False, True):
+            results.append(transfer_benchmark(channels, multi_value, latency, duration))
+    for channels in (24, 512):
+        for universe_count in sorted({1, universes}):
+            results.append(engine_benchmark(channels, universe_count, latency, duration, frame_rate, failure_rate))
+    for output_process in (False, True):
+        results.append(load_benchmark(512, universes, duration, frame_rate, output_process))
+    return results
+
+
+def print_table(results: list) -> None:
+    columns = ('scenario', 'mode', 'channels', 'universes', 'frames_per_second', 'jitter_ms', 'transfers_per_frame',
+               'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'cpu_percent')
+    rows = [[('{:.2f}'.format(result[column]) if isinstance(result.get(column), float)
+              else str(result.get(column, '-'))) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    for row in [list(columns)] + rows:
+        print('  '.join(cell.ljust(width) if i < 2 else cell.rjust(width)
+                        for i, (cell, width) in enumerate(zip(row, widths))))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the DMX output path against loopback interfaces")
+    parser.add_argument('--duration', type=float, default=2.0, help="seconds per scenario")
+    parser.add_argument('--latency', type=float, default=0.0005, help="simulated seconds per USB transfer")
+    parser.add_argument('--universes', type=int, default=4, help="universe count for the multi-universe runs")
+    parser.add_argument('--frame-rate', type=float, default=OutputEngine.max_frame_rate)
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="fraction of engine transfers that fail, to measure reconnect cost")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    arguments = parser.parse_args()
+    benchmark_results = run(arguments.duration, arguments.latency, arguments.universes, arguments.frame_rate,
+                            arguments.failure_rate)
+    if arguments.json:
+        print(json.dumps(benchmark_results, indent=2))
+    else:
+        print_table(benchmark_results)
@@ -0,0 +1,335 @@
+import threading
+
+from bisect import bisect_right
+
+import fades
+from engine import htp_ltp_merge
+from fades import Crossfade
+
+
+class Cue:
+    def __init__(self, preset: int, fade_in: float = 0.0, fade_out: float = None, wait: float = 0.0,
+                 follow: float = None, curve: str = 'linear'):
+        """
+        :param preset: index into the preset list
+        :param fade_in: seconds taken by channels that rise
+        :param fade_out: seconds taken by channels that fall, defaults to fade_in
+        :param wait: seconds between the GO and the start of the fade
+        :param follow: seconds after this cue's GO at which the next cue runs by itself,
+            or None to wait for a manual GO
+        :param curve: one of fades.CURVES
+        """
+        self.preset = preset
+        self.fade_in = fade_in
+        self.fade_out = fade_in if fade_out is None else fade_out
+        self.wait = wait
+        self.follow = follow
+        self.curve = curve
+
+    @classmethod
+    def from_dict(cls, cue_dict: dict):
+        return cls(**cue_dict)
+
+    def to_dict(self) -> dict:
+        return {'preset': self.preset, 'fade_in': self.fade_in, 'fade_out': self.fade_out,
+                'wait': self.wait, 'follow': self.follow, 'curve': self.curve}
+
+
+class Timeline:
+    """
+    A compiled run of crossfades. Every step already holds its source and target frames and
+    its start time, so rendering a frame is a bisect and one crossfade.
+    """
+    def __init__(self, initial: bytes, steps: list, length: float = None):
+        """
+        :param initial: frame output before the first step starts
+        :param steps: list of (start time, Crossfade, target frame) sorted by start time
+        :param length: loop length in seconds, or None to hold the last step
+        """
+        self.initial = initial
+        self.starts = [start for start, _, _ in steps]
+        self.steps = steps
+        self.length = length
+
+    def frame(self, elapsed: float) -> bytes:
+        if self.length:
+            elapsed %= self.length
+        index = bisect_right(self.starts, elapsed) - 1
+        if index < 0:
+            return self.initial
+        _, fade, target = self.steps[index]
+        return fade.render(target, elapsed)[0]
+
+
+def preset_frame(presets: list, index: int) -> bytes:
+    try:
+        return bytes(int(value) for value in presets[index])
+    except (IndexError, TypeError):
+        return bytes()
+
+
+def compile_cue_list(cues: list, presets: list) -> list:
+    """
+    Compile a cue list into one Timeline per manual GO. Cues with a follow time are
+    chained into the timeline of the cue before them.
+    :param cues: list of Cue
+    :param presets: the preset list, each preset a list of channel values
+    :return: list of Timeline, the first one starting from a blackout
+    """
+    size = max((len(preset) for preset in presets), default=0)
+    timelines = []
+    current = bytes(size)
+    steps = []
+    initial = current
+    offset = 0.0
+    for i, cue in enumerate(cues):
+        target = preset_frame(presets, cue.preset).ljust(size, b'\0')
+        start = offset + cue.wait
+        steps.append((start, Crossfade(current, cue.fade_in, cue.fade_out, cue.curve, start), target))
+        current = target
+        if cue.follow is None or i == len(cues) - 1:
+            timelines.append(Timeline(initial, steps))
+            steps = []
+            initial = current
+            offset = 0.0
+        else:
+            offset += cue.follow
+    return timelines
+
+
+def compile_chase(preset_indices: list, presets: list, bpm: float, crossfade: float = 0.0) -> Timeline:
+    """
+    Compile a looping chase that steps through presets in time with a tempo.
+    :param preset_indices: presets to step through, in order
+    :param presets: the preset list, each preset a list of channel values
+    :param bpm: steps per minute
+    :param crossfade: fraction of each step spent fading into it, 0-1
+    :return: a looping Timeline
+    """
+    size = max((len(preset) for preset in presets), default=0)
+    frames = [preset_frame(presets, index).ljust(size, b'\0') for index in preset_indices]
+    step_time = 60 / bpm
+    fade_time = step_time * min(max(crossfade, 0.0), 1.0)
+    steps = []
+    for i, target in enumerate(frames):
+        start = i * step_time
+        steps.append((start, Crossfade(frames[i - 1], fade_time, fade_time, 'linear', start), target))
+    return Timeline(frames[-1] if frames else bytes(size), steps, step_time * len(frames) or None)
+
+
+class Playback:
+    """
+    Plays compiled timelines against the output engine's frame clock. Manual actions
+    (go, back, release) just swap which timeline is playing and when it started; the
+    pair is replaced in one assignment, so the engine thread never sees half of a GO.
+    The desk merges the cue levels into its own levels every frame, see merge().
+    """
+    def __init__(self, patch):
+        """
+        :param patch: the patch.Patch the cue levels are desk levels of
+        """
+        self.patch = patch
+        self.htp = int.from_bytes(patch.htp, 'big')
+        self.ltp = 0
+        self.timelines = []
+        self.first_cues = []
+        self.cue_timelines = []
+        self.presets = []
+        # (preset indices, bpm, crossfade) of the chase that is playing, or None
+        self.chase = None
+        self.position = (-1, 0.0)
+
+    @property
+    def index(self) -> int:
+        return self.position[0]
+
+    @property
+    def cue_index(self) -> int:
+        """
+        Returns the index of the cue the playing timeline started from, or None.
+        """
+        if self.chase is None and 0 <= self.index < len(self.first_cues):
+            return self.first_cues[self.index]
+        return None
+
+    def load_cue_list(self, cues: list, presets: list) -> None:
+        """
+        Compile the cue list against the presets. What is playing keeps playing: a running cue keeps
+        its index and elapsed time, and a running chase is compiled again with the new presets.
+        """
+        self.cue_timelines = compile_cue_list(cues, presets)
+        self.first_cues = [0] + [i + 1 for i, cue in enumerate(cues[:-1]) if cue.follow is None]
+        self.presets = presets
+        if self.chase is not None:
+            preset_indices, bpm, crossfade = self.chase
+            self.timelines = [compile_chase(preset_indices, presets, bpm, crossfade)]
+        else:
+            self.timelines = self.cue_timelines
+            if self.index >= len(self.timelines):
+                self.position = (-1, 0.0)
+        self.compile_ltp()
+
+    def load_chase(self, preset_indices: list, presets: list, bpm: float, crossfade: float, now: float) -> None:
+        self.position = (-1, 0.0)
+        self.chase = (list(preset_indices), bpm, crossfade)
+        self.presets = presets
+        self.timelines = [compile_chase(preset_indices, presets, bpm, crossfade)]
+        self.compile_ltp()
+        self.position = (0, now)
+
+    def set_chase_tempo(self, bpm: float, now: float) -> bool:
+        """
+        Retime the running chase so a step starts at now, e.g. on a tapped beat. The chase goes on
+        from the step whose start is nearest to now.
+        :return: False if no chase is playing
+        """
+        chase, (index, started) = self.chase, self.position
+        if chase is None or index < 0:
+            return False
+        preset_indices, old_bpm, crossfade = chase
+        step = round((now - started) * old_bpm / 60) % max(len(preset_indices), 1)
+        self.chase = (preset_indices, bpm, crossfade)
+        self.timelines = [compile_chase(preset_indices, self.presets, bpm, crossfade)]
+        self.position = (0, now - step * 60 / bpm)
+        return True
+
+    def compile_ltp(self) -> None:
+        self.ltp = self.patch.ltp_mask([target for timeline in self.timelines for _, _, target in timeline.steps])
+
+    def go(self, now: float) -> None:
+        if self.index + 1 < len(self.timelines):
+            self.position = (self.index + 1, now)
+
+    def back(self, now: float) -> None:
+        if self.index > 0:
+            self.position = (self.index - 1, now)
+
+    def release(self) -> None:
+        self.position = (-1, 0.0)
+        if self.chase is not None:
+            # The cue list takes over again once the chase is released.
+            self.chase = None
+            self.timelines = self.cue_timelines
+            self.compile_ltp()
+
+    @property
+    def active(self) -> bool:
+        return 0 <= self.index < len(self.timelines)
+
+    def frame(self, now: float) -> bytes:
+        """
+        :param now: the current time, on the same clock as go()
+        :return: the cue levels playing now, or None if nothing is playing
+        """
+        index, started = self.position
+        timelines = self.timelines
+        if not 0 <= index < len(timelines):
+            return None
+        return timelines[index].frame(now - started)
+
+    def merge(self, levels: bytes, now: float) -> bytes:
+        """
+        Merge the cue levels into desk levels like a raised playback fader: the higher of the two
+        on the HTP channels, the cue's own level on the LTP channels of the fixtures it uses.
+        """
+        frame = self.frame(now)
+        if frame is None:
+            return levels
+        size = len(levels)
+        return htp_ltp_merge(levels, frame.ljust(size, b'\0')[:size], self.htp, self.ltp)
+
+
+class PlaybackFader:
+    """
+    A playback fader holding a preset, or a cue that plays with the cues that follow it
+    from the moment the fader is raised.
+    """
+    def __init__(self, preset: int = None, cue: int = None):
+        self.preset = preset
+        self.cue = cue
+        self.level = 0
+        self.frame = bytes()
+        self.timeline = None
+        self.started = 0.0
+        self.ltp = 0
+
+    @classmethod
+    def from_dict(cls, fader_dict: dict):
+        return cls(**fader_dict)
+
+    def to_dict(self) -> dict:
+        return {'preset': self.preset, 'cue': self.cue}
+
+    def describe(self) -> str:
+        if self.cue is not None:
+            return "Cue {}".format(self.cue + 1)
+        if self.preset is not None:
+            return "Preset {}".format(self.preset)
+        return "Empty"
+
+
+class PlaybackMixer:
+    """
+    Merges the raised playback faders into the desk levels, in the order they were raised.
+    HTP channels take the highest of the levels and the playback scaled by its fader; LTP
+    channels of the fixtures a playback uses snap to the playback as soon as it is raised.
+    Only raised faders are looked at, so idle playbacks cost nothing.
+    """
+    def __init__(self, patch, count: int = 8):
+        self.patch = patch
+        self.htp = int.from_bytes(patch.htp, 'big')
+        self.faders = [PlaybackFader() for _ in range(count)]
+        self.active = []
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.active)
+
+    @property
+    def animated(self) -> bool:
+        return any(fader.timeline is not None for fader in self.active)
+
+    def assign(self, index: int, preset: int = None, cue: int = None) -> None:
+        fader = self.faders[index]
+        fader.preset, fader.cue = preset, cue
+
+    def compile(self, cue_list: list, presets: list) -> None:
+        """
+        Compile what every fader holds against the current cues and presets.
+        """
+        size = len(self.patch.channels)
+        for fader in self.faders:
+            timeline = None
+            frames = []
+            if fader.cue is not None and 0 <= fader.cue < len(cue_list):
+                timeline = compile_cue_list(cue_list[fader.cue:], presets)[0]
+                frames = [target for _, _, target in timeline.steps]
+            elif fader.preset is not None:
+                frames = [preset_frame(presets, fader.preset)]
+            fader.frame = (frames[0] if frames and timeline is None else bytes()).ljust(size, b'\0')[:size]
+            fader.ltp = self.patch.ltp_mask(frames)
+            fader.timeline = timeline
+
+    def set_level(self, index: int, level: int, now: float) -> None:
+        fader = self.faders[index]
+        with self._lock:
+            if level and not fader.level:
+                fader.started = now
+                self.active.append(fader)
+            elif not level and fader.level:
+                self.active.remove(fader)
+            fader.level = level
+
+    def apply(self, levels: bytes, now: float) -> bytes:
+        size = len(levels)
+        for fader in list(self.active):
+            frame = fader.frame
+            if fader.timeline is not None:
+                frame = fader.timeline.frame(now - fader.started).ljust(size, b'\0')[:size]
+            values = fades.scale(frame, fader.level)
+            if fader.ltp:
+                # LTP channels are not faded: they take the playback's own level.
+                values = ((int.from_bytes(values, 'big') & self.htp) |
+                          (int.from_bytes(frame, 'big') & fader.ltp)).to_bytes(size, 'big')
+            levels = htp_ltp_merge(levels, values, self.htp, fader.ltp)
+        return levels
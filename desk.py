@@ -0,0 +1,281 @@
+import threading
+import time
+
+import cues
+from effects import Effect, Effects
+from patch import Patch
+
+
+class DeskCore:
+    """
+    The desk state that decides what goes out on the wire: fader levels, flash buttons,
+    grand master, blackout, preset recall and the cue playback. It has no Tk dependency,
+    so it can run headless and be driven by the GUI and the network API alike.
+
+    Every desk channel drives one fixture attribute of the patch; without a patch, desk
+    channel n drives a dimmer at channel n of the first universe. Sub-masters scale the HTP
+    channels of a group of desk channels on top of the grand master.
+    """
+    def __init__(self, output, storage, channel_count: int = 24, patch: Patch = None):
+        self.output = output
+        self.storage = storage
+        self.patch = patch or Patch.dimmers(min(max(channel_count, 1), output.universes.universe_size),
+                                            storage.read_variable('dimmer_curve'),
+                                            storage.read_variable('dimmer_curves'))
+        self.levels = bytearray(len(self.patch.channels))
+        self.flashed = set()
+        self.grand_master = 255
+        self.submasters = {name: (channels, 255) for name, channels in
+                           (storage.read_variable('submasters') or {}).items()}
+        self.blackout = False
+        # Bumped by every change a view shows (levels, grand master, blackout), from any thread.
+        self.version = 0
+        self.playback = cues.Playback(self.patch)
+        self.effects = Effects(self.patch.htp)
+        self.mixer = cues.PlaybackMixer(self.patch, storage.read_variable('playback_count') or 8)
+        for index, fader in enumerate((storage.read_variable('playbacks') or [])[:len(self.mixer.faders)]):
+            self.mixer.assign(index, **fader)
+        self.output.add_frame_callback(self.animate)
+        self.lock = threading.RLock()
+        self.load_playbacks()
+
+    @property
+    def master(self) -> int:
+        return 0 if self.blackout else self.grand_master
+
+    def update(self, start: int = 0, end: int = None) -> None:
+        """
+        Publish the output of desk channels start+1 to end, or of every channel.
+        """
+        with self.lock:
+            master = self.master
+            if self.animated:
+                # animate() publishes the whole desk every frame while effects or cues run.
+                return
+            self.publish(self.compose(time.perf_counter()), master, start, end)
+
+    @property
+    def animated(self) -> bool:
+        return bool(self.effects) or self.mixer.animated or self.playback.active
+
+    def compose(self, now: float) -> bytes:
+        """
+        :return: the desk levels with flashes, the cue playback, raised playbacks and effects merged in,
+            before the masters
+        """
+        levels = self.flashed_levels()
+        if self.playback.active:
+            levels = self.playback.merge(levels, now)
+        if self.mixer:
+            levels = self.mixer.apply(levels, now)
+        if self.effects:
+            levels = self.effects.apply(levels, now)
+        return levels
+
+    def flashed_levels(self) -> bytearray:
+        levels = bytearray(self.levels)
+        for channel in self.flashed:
+            if 0 < channel <= len(levels):
+                levels[channel - 1] = 255
+        return levels
+
+    def publish(self, levels: bytes, master: int, start: int = 0, end: int = None) -> None:
+        universe_count = self.output.universes.universe_count
+        if end is None:
+            for universe, frame in self.patch.render(levels, master).items():
+                if universe < universe_count:
+                    self.output.publish(1, frame, universe)
+        else:
+            for universe, address, value in self.patch.render_channels(levels, master, start, end):
+                if universe < universe_count:
+                    self.output.publish(address, (value,), universe)
+
+    def animate(self, now: float) -> None:
+        """
+        Called by the output engine at the start of every frame: while effects or playback cues
+        run, composes the desk levels and publishes the result.
+        """
+        if not self.animated:
+            return
+        with self.lock:
+            self.publish(self.compose(now), self.master)
+
+    def start_effect(self, waveform: str, groups: list, rate: float = 1.0, size: int = 255, offset: int = 0,
+                     spread: float = 1.0) -> int:
+        """
+        Start an effect, see effects.Effect for the parameters.
+        :return: an id for stop_effect
+        """
+        effect_id = self.effects.add(Effect(waveform, groups, rate, size, offset, spread))
+        self.output.wake()
+        return effect_id
+
+    def stop_effect(self, effect_id: int = None) -> None:
+        """
+        :param effect_id: the effect to stop, or None to stop every effect
+        """
+        if effect_id is None:
+            self.effects.clear()
+        else:
+            self.effects.remove(effect_id)
+        self.update()
+
+    def set_levels(self, start_channel: int, values) -> None:
+        """
+        :param start_channel: channel of the first value, 1-based
+        :param values: fader levels 0-255
+        """
+        start = start_channel - 1
+        if not 0 <= start < len(self.levels):
+            return
+        values = bytes(values)[:len(self.levels) - start]
+        with self.lock:
+            if self.levels[start:start + len(values)] != values:
+                self.levels[start:start + len(values)] = values
+                self.version += 1
+                self.update(start, start + len(values))
+
+    def set_channel(self, channel: int, value: int) -> None:
+        self.set_levels(channel, [value])
+
+    def flash(self, channel: int, active: bool) -> None:
+        with self.lock:
+            if active:
+                self.flashed.add(channel)
+            else:
+                self.flashed.discard(channel)
+            self.update(channel - 1, channel)
+
+    def set_grand_master(self, level: int) -> None:
+        level = min(max(int(level), 0), 255)
+        if level != self.grand_master:
+            self.grand_master = level
+            self.version += 1
+            self.update()
+
+    def set_submaster(self, name: str, level: int, channels: list = None) -> None:
+        """
+        :param name: sub-master to set, created if channels are given
+        :param level: 0-255
+        :param channels: desk channels of the sub-master, 1-based, or None to keep them
+        """
+        level = min(max(int(level), 0), 255)
+        with self.lock:
+            if channels is None:
+                if name not in self.submasters:
+                    return
+                channels = self.submasters[name][0]
+            if self.submasters.get(name) == (list(channels), level):
+                return
+            self.submasters[name] = (list(channels), level)
+            scales = bytearray(b'\xff' * len(self.levels))
+            for group, group_level in self.submasters.values():
+                for channel in group:
+                    if 1 <= channel <= len(scales):
+                        scales[channel - 1] = scales[channel - 1] * group_level // 255
+            self.patch.set_scales(scales)
+            self.update()
+
+    def set_curve(self, channel: int, curve: str) -> None:
+        """
+        :param channel: desk channel, 1-based
+        :param curve: one of fades.CURVES or a custom curve from the 'dimmer_curves' setting
+        """
+        with self.lock:
+            self.patch.set_curve(channel - 1, curve)
+            self.update()
+
+    def set_blackout(self, blackout: bool) -> None:
+        if bool(blackout) != self.blackout:
+            self.blackout = bool(blackout)
+            self.version += 1
+            self.update()
+
+    def presets(self) -> list:
+        preset_dict = self.storage.get_preset_dict()
+        preset_list = [None] * (max((position for position, _ in preset_dict.values()), default=-1) + 1)
+        for position, levels in preset_dict.values():
+            preset_list[position] = levels
+        return preset_list
+
+    def recall_preset(self, index: int, fade_in: float = 0.0, fade_out: float = 0.0, curve: str = 'linear') -> bool:
+        """
+        Load a stored preset into the fader levels, optionally crossfading to it.
+        :return: False if there is no preset at that index
+        """
+        presets = self.presets()
+        if not 0 <= index < len(presets) or presets[index] is None:
+            return False
+        levels = presets[index]
+        if fade_in or fade_out:
+            self.start_fade(fade_in, fade_out, curve)
+        self.set_levels(1, [int(level) for level in levels])
+        return True
+
+    def start_fade(self, fade_in: float, fade_out: float, curve: str = 'linear') -> None:
+        """
+        Crossfade every universe with patched fixtures to whatever the desk publishes next.
+        """
+        universe_count = self.output.universes.universe_count
+        for universe in self.patch.index:
+            if universe < universe_count:
+                self.output.start_fade(fade_in, fade_out, curve, universe)
+
+    def read_cue_list(self) -> list:
+        return [cues.Cue.from_dict(cue) for cue in self.storage.read_variable('cue_list') or []]
+
+    def load_cue_list(self) -> None:
+        self.playback.load_cue_list(self.read_cue_list(), self.presets())
+        self.update()
+
+    def load_playbacks(self) -> None:
+        """
+        Recompile the playback faders, after presets or cues have changed.
+        """
+        with self.lock:
+            self.mixer.compile(self.read_cue_list(), self.presets())
+            self.update()
+
+    def assign_playback(self, index: int, preset: int = None, cue: int = None) -> None:
+        """
+        :param index: playback fader, 0-based
+        :param preset: preset index to hold
+        :param cue: cue index to hold, played with the cues that follow it
+        """
+        self.mixer.assign(index, preset, cue)
+        self.storage.write_variable('playbacks', [fader.to_dict() for fader in self.mixer.faders])
+        self.load_playbacks()
+
+    def set_playback_level(self, index: int, level: int) -> None:
+        if not 0 <= index < len(self.mixer.faders):
+            return
+        level = min(max(int(level), 0), 255)
+        with self.lock:
+            if level == self.mixer.faders[index].level:
+                return
+            self.mixer.set_level(index, level, time.perf_counter())
+            self.update()
+        self.output.wake()
+
+    def set_chase_tempo(self, bpm: float, now: float = None) -> bool:
+        """
+        Retime the running chase so a step starts now, e.g. on a tapped or heard beat.
+        :return: False if no chase is playing
+        """
+        if not self.playback.set_chase_tempo(bpm, time.perf_counter() if now is None else now):
+            return False
+        self.output.wake()
+        return True
+
+    def go(self) -> None:
+        self.playback.go(time.perf_counter())
+        self.output.wake()
+
+    def back(self) -> None:
+        self.playback.back(time.perf_counter())
+        self.output.wake()
+
+    def release(self) -> None:
+        self.playback.release()
+        # The cue levels are only merged while the playback runs, so the desk is published without them.
+        self.update()
@@ -0,0 +1,112 @@
+import itertools
+import math
+import random
+import threading
+import time
+
+from engine import htp_ltp_merge
+
+# Every waveform is one cycle sampled at 256 phases, 0-255 each.
+_RANDOM = random.Random(0x5eed)
+_RANDOM_STEPS = [_RANDOM.randrange(256) for _ in range(16)]
+WAVEFORMS = {
+    'sine': bytes(round((1 - math.cos(2 * math.pi * phase / 256)) * 127.5) for phase in range(256)),
+    'square': bytes(255 if phase < 128 else 0 for phase in range(256)),
+    'saw': bytes(range(256)),
+    'triangle': bytes(min(2 * phase, 511 - 2 * phase) for phase in range(256)),
+    'random': bytes(_RANDOM_STEPS[phase // 16] for phase in range(256)),
+}
+
+# _ROTATE[r] advances every phase of a frame by r, so moving an effect on is one translate.
+_ROTATE = [bytes((phase + rotation) & 255 for phase in range(256)) for rotation in range(256)]
+
+
+class Effect:
+    def __init__(self, waveform: str, groups: list, rate: float = 1.0, size: int = 255, offset: int = 0,
+                 spread: float = 1.0):
+        """
+        :param waveform: one of WAVEFORMS
+        :param groups: lists of desk channels, 1-based; channels of a group move together
+        :param rate: cycles per second
+        :param size: level swing 0-255
+        :param offset: lowest level 0-255
+        :param spread: fraction of a cycle the phases of the groups are spread over,
+            0 moves every group together and 1 spreads them evenly round the cycle
+        """
+        self.waveform = waveform
+        self.groups = [list(group) for group in groups]
+        self.rate = rate
+        self.size = size
+        self.offset = offset
+        self.spread = spread
+        self.table = WAVEFORMS[waveform].translate(bytes(min(offset + level * size // 255, 255)
+                                                         for level in range(256)))
+        self.started = time.perf_counter()
+        self.phases = self.mask = None
+
+    def compile(self, channel_count: int) -> None:
+        """
+        Lay the effect out over the whole desk: a start phase for every channel and a mask of
+        the channels it drives.
+        """
+        phases = bytearray(channel_count)
+        mask = bytearray(channel_count)
+        for index, group in enumerate(self.groups):
+            phase = round(index * self.spread * 256 / len(self.groups)) & 255
+            for channel in group:
+                if 1 <= channel <= channel_count:
+                    phases[channel - 1] = phase
+                    mask[channel - 1] = 255
+        self.phases = bytes(phases)
+        self.mask = int.from_bytes(mask, 'big')
+
+    def render(self, now: float) -> bytes:
+        """
+        :param now: the current time, on the time.perf_counter() clock
+        :return: the effect level of every desk channel, including those it does not drive
+        """
+        rotation = int((now - self.started) * self.rate * 256) & 255
+        return self.phases.translate(_ROTATE[rotation]).translate(self.table)
+
+
+class Effects:
+    """
+    The running effects of a desk. Effects are applied to the desk levels in the order they
+    were started: HTP channels take the highest of the levels and the effect, any other
+    channel driven by an effect takes the effect level.
+    """
+    def __init__(self, htp: bytes):
+        """
+        :param htp: 255 for every HTP desk channel, 0 for every LTP one
+        """
+        self.channel_count = len(htp)
+        self.htp = int.from_bytes(htp, 'big')
+        self.running = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.running)
+
+    def add(self, effect: Effect) -> int:
+        """
+        :return: an id to stop the effect with
+        """
+        effect.compile(self.channel_count)
+        with self._lock:
+            effect_id = next(self._ids)
+            self.running[effect_id] = effect
+        return effect_id
+
+    def remove(self, effect_id: int) -> None:
+        with self._lock:
+            self.running.pop(effect_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.running.clear()
+
+    def apply(self, levels: bytes, now: float) -> bytes:
+        for effect in list(self.running.values()):
+            levels = htp_ltp_merge(levels, effect.render(now), effect.mask & self.htp, effect.mask & ~self.htp)
+        return levels
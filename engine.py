@@ -0,0 +1,218 @@
+import threading
+import time
+
+from collections import deque
+from fades import Crossfade
+from instrumentation import Profiler
+
+
+def htp_merge(first: bytes, second: bytes) -> bytes:
+    """
+    Highest takes precedence: the larger value of each channel, over the length of the shorter frame.
+    """
+    return bytes(map(max, first, second))
+
+
+def htp_ltp_merge(levels: bytes, values: bytes, htp: int, ltp: int) -> bytes:
+    """
+    Merge values into levels of the same length: the higher of the two on the HTP channels,
+    the value on the LTP channels, and the level everywhere else.
+    :param htp: big-endian mask of the HTP channels, 0xff per channel
+    :param ltp: big-endian mask of the LTP channels, 0xff per channel
+    """
+    size = len(levels)
+    values = int.from_bytes(values, 'big')
+    merged = ((values & ltp) | (int.from_bytes(levels, 'big') & ~ltp)).to_bytes(size, 'big')
+    if htp:
+        merged = htp_merge(merged, (values & htp).to_bytes(size, 'big'))
+    return merged
+
+
+class OutputEngine(threading.Thread):
+    """
+    Drives a UniverseManager from its own thread at a fixed frame rate, so the DMX
+    refresh no longer depends on how busy the Tk mainloop is.
+
+    Producers publish channel values into per-universe back buffers; once per frame the
+    engine copies the changed back buffers to its front buffers (the only time the lock
+    is held) and sends the front buffers to the universes. When nothing is published,
+    fading or playing, the engine sleeps until the next publish instead of ticking.
+    """
+    max_frame_rate = 44
+    idle_timeout = 1.0
+
+    def __init__(self, universes, frame_rate: float = max_frame_rate):
+        super().__init__(name="OutputEngine", daemon=True)
+        self.universes = universes
+        self.frame_rate = min(float(frame_rate), self.max_frame_rate)
+        self.period = 1 / self.frame_rate
+        self._back = [bytearray(universes.universe_size) for _ in range(universes.universe_count)]
+        self._front = [bytearray(universes.universe_size) for _ in range(universes.universe_count)]
+        self._pending = set()
+        self._fades = {}
+        self._sourced = set()
+        self.sources = []
+        self.frame_callbacks = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self._intervals = deque(maxlen=int(self.frame_rate * 2))
+        self._lateness = deque(maxlen=int(self.frame_rate * 2))
+        self.frames_sent = 0
+        self.late_frames = 0
+        self.profiler = Profiler()
+        universes.set_profiler(self.profiler)
+
+    def publish(self, start_channel: int, values, universe: int = 0) -> None:
+        """
+        Set the target values of consecutive channels for the next frame.
+        :param start_channel: DMX channel of the first value, 1-512
+        :param values: sequence of values 0-255
+        :param universe: logical universe index, starting at 0
+        """
+        start = start_channel - 1
+        with self._lock:
+            self._back[universe][start:start + len(values)] = bytes(values)
+            self._pending.add(universe)
+        self._wake.set()
+
+    def add_source(self, source) -> None:
+        """
+        Merge another frame source into the output, highest takes precedence.
+        :param source: any object with a render(now) method returning {universe: frame},
+            where now is a time.perf_counter() value; a frame may instead be (frame, ltp), where
+            ltp is a big-endian mask, 0xff per slot, of the slots that replace the output
+        """
+        self.sources.append(source)
+
+    def add_frame_callback(self, callback) -> None:
+        """
+        :param callback: called with time.perf_counter() at the start of every frame, before the
+            back buffers are copied, so anything it publishes goes out in that frame
+        """
+        self.frame_callbacks.append(callback)
+
+    def start_fade(self, fade_in: float, fade_out: float, curve: str = 'linear', universe: int = 0) -> None:
+        """
+        Crossfade a universe from its current output to whatever is published from now on.
+        :param fade_in: seconds taken by channels that rise
+        :param fade_out: seconds taken by channels that fall
+        :param curve: one of fades.CURVES
+        :param universe: logical universe index, starting at 0
+        """
+        with self._lock:
+            self._fades[universe] = Crossfade(self._front[universe], fade_in, fade_out, curve, time.perf_counter())
+            self._pending.add(universe)
+        self._wake.set()
+
+    def wake(self) -> None:
+        """
+        Resume ticking after an idle period; call it when a source starts producing frames.
+        """
+        self._wake.set()
+
+    @property
+    def idle(self) -> bool:
+        return not (self._pending or self._fades or self._sourced)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join(self.period * 4)
+
+    def run(self) -> None:
+        last_start = None
+        due = time.perf_counter()
+        while not self._stopped.is_set():
+            now = time.perf_counter()
+            if last_start is not None:
+                self._intervals.append(now - last_start)
+            self._lateness.append(max(now - due, 0.0))
+            last_start = now
+            self._wake.clear()
+            self.send_frame()
+            if self.idle and not self._wake.is_set():
+                # Frame callbacks that published this frame set _wake, so animations keep the clock.
+                # The timeout keeps flushing now and then, so a lost interface still gets reconnected.
+                self._wake.wait(self.idle_timeout)
+                # Output resumes at once after the wait, but never faster than the frame rate.
+                due = max(time.perf_counter(), last_start + self.period)
+            else:
+                due += self.period
+                if due <= time.perf_counter():
+                    # Too far behind to catch up without bursting frames: start a fresh schedule.
+                    self.late_frames += 1
+                    due = time.perf_counter()
+            delay = due - time.perf_counter()
+            if delay > 0:
+                self._stopped.wait(delay)
+
+    def send_frame(self) -> None:
+        now = time.perf_counter()
+        profiler = self.profiler
+        for callback in list(self.frame_callbacks):
+            callback(now)
+        rendered = {}
+        for source in list(self.sources):
+            for universe, frame in source.render(now).items():
+                rendered.setdefault(universe, []).append(frame if isinstance(frame, tuple) else (frame, 0))
+        with self._lock:
+            changed, self._pending = self._pending, set()
+            # Universes a source played into last frame are rebuilt too, so released sources disappear.
+            changed.update(rendered, self._sourced)
+            for universe in changed:
+                self._front[universe][:] = self._back[universe]
+            fades = {universe: (fade, bytes(self._back[universe])) for universe, fade in self._fades.items()}
+        self._sourced = set(rendered)
+        for universe, (fade, target) in fades.items():
+            self._front[universe][:], finished = fade.render(target, now)
+            changed.add(universe)
+            if finished:
+                with self._lock:
+                    if self._fades.get(universe) is fade:
+                        del self._fades[universe]
+        for universe, frames in rendered.items():
+            front = self._front[universe]
+            for frame, ltp in frames:
+                size = len(frame)
+                if ltp:
+                    front[:size] = htp_ltp_merge(front[:size], frame, ~ltp & ((1 << 8 * size) - 1), ltp)
+                else:
+                    front[:size] = htp_merge(front[:size], frame)
+        composed = time.perf_counter()
+        profiler.record('compose', composed - now)
+        for universe in changed:
+            self.universes.write_frame(universe, 1, self._front[universe])
+        self.universes.flush()
+        finished = time.perf_counter()
+        profiler.record('submit', finished - composed)
+        profiler.record('tick', finished - now)
+        self.frames_sent += 1
+
+    @property
+    def fps(self) -> float:
+        """
+        Frames sent per second recently, idle waits included.
+        """
+        intervals = list(self._intervals)
+        if not intervals:
+            return 0.0
+        return len(intervals) / sum(intervals)
+
+    @property
+    def jitter(self) -> float:
+        """
+        Mean lateness of the recent frames, in seconds: how long after it was due every frame
+        started, either its slot on the schedule or the wake-up that ended an idle wait.
+        """
+        lateness = list(self._lateness)
+        if not lateness:
+            return 0.0
+        return sum(lateness) / len(lateness)
+
+    def stats(self) -> dict:
+        stats = {'frame_rate': self.frame_rate, 'fps': self.fps, 'jitter': self.jitter,
+                 'frames_sent': self.frames_sent, 'late_frames': self.late_frames, 'idle': self.idle}
+        stats.update(self.universes.stats())
+        return stats
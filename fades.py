@@ -0,0 +1,76 @@
+import operator
+
+# Fade curves map the elapsed fraction of a fade (0-1) to the fraction of the way to the target.
+CURVES = {
+    'linear': lambda t: t,
+    's-curve': lambda t: t * t * (3 - 2 * t),
+    'square': lambda t: t * t,
+}
+
+# _KEEP[w][v] and _GAIN[w][v] split a crossfade at weight w (0-255) into a part of the source and a
+# part of the target value v. _KEEP is v - _GAIN, so an unchanged channel never dips, and the two parts
+# of any channel add up to at most 255.
+_GAIN = [bytes(v * w // 255 for v in range(256)) for w in range(256)]
+_KEEP = [bytes(v - gain for v, gain in enumerate(_GAIN[w])) for w in range(256)]
+_MASK = bytes([0] + [255] * 255)
+
+
+def crossfade(source: bytes, target: bytes, weight: int) -> bytes:
+    """
+    Interpolate every channel of a frame in one step.
+    Each byte of the two translated frames is at most 255 when added together, so the
+    frames can be summed as big integers without any carry between channels.
+    :param source: frame at the start of the fade
+    :param target: frame at the end of the fade, the same length as source
+    :param weight: 0 (all source) to 255 (all target)
+    :return: the interpolated frame
+    """
+    mixed = (int.from_bytes(source.translate(_KEEP[weight]), 'big') +
+             int.from_bytes(target.translate(_GAIN[weight]), 'big'))
+    return mixed.to_bytes(len(source), 'big')
+
+
+def scale(frame: bytes, level: int) -> bytes:
+    """
+    Scale every channel of a frame by a master level.
+    :param frame: channel values 0-255
+    :param level: 0-255, where 255 leaves the frame unchanged
+    :return: the scaled frame
+    """
+    return bytes(frame).translate(_GAIN[level])
+
+
+class Crossfade:
+    """
+    A split crossfade from a fixed source frame towards a target frame that may keep
+    changing while the fade runs. Rising channels use the fade in time and falling
+    channels the fade out time.
+    """
+    def __init__(self, source: bytes, fade_in: float, fade_out: float, curve: str = 'linear', started: float = 0.0):
+        self.source = bytes(source)
+        self.fade_in = max(fade_in, 0.0)
+        self.fade_out = max(fade_out, 0.0)
+        self.curve = CURVES[curve]
+        self.started = started
+        self.duration = max(self.fade_in, self.fade_out)
+
+    def weight(self, fade_time: float, elapsed: float) -> int:
+        if elapsed >= fade_time:
+            return 255
+        return round(self.curve(elapsed / fade_time) * 255)
+
+    def render(self, target: bytes, now: float) -> (bytes, bool):
+        """
+        :param target: the frame the fade is heading towards
+        :param now: the current time, on the same clock as started
+        :return: the output frame and whether the fade has finished
+        """
+        elapsed = now - self.started
+        if elapsed >= self.duration:
+            return bytes(target), True
+        size = len(self.source)
+        rising = int.from_bytes(bytes(map(operator.gt, target, self.source)).translate(_MASK), 'big')
+        faded_in = int.from_bytes(crossfade(self.source, target, self.weight(self.fade_in, elapsed)), 'big')
+        faded_out = int.from_bytes(crossfade(self.source, target, self.weight(self.fade_out, elapsed)), 'big')
+        falling = ~rising & ((1 << (8 * size)) - 1)
+        return ((faded_in & rising) | (faded_out & falling)).to_bytes(size, 'big'), False
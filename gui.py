@@ -0,0 +1,856 @@
+import time
+import tkinter
+
+from tkinter import ttk
+
+import audio
+import cues
+import effects
+import fades
+from presets import PresetIndex, PreviewCache, preview_columns
+
+
+class GUI:
+    def __init__(self, core, storage, audio_reactive=None):
+        self.storage = storage
+        self.core = core
+        # Created on the first tap of the tempo key if the desk was not started with --audio.
+        self.audio = audio_reactive
+        # The channel levels live in core.levels; the fader bank only has widgets for one page
+        # of channels and rebinds them when the page changes.
+        self.channel_count = len(core.levels)
+        self.page_size = min(self.storage.read_variable('fader_page_size') or 24, self.channel_count)
+        self.page = 0
+        self.master = tkinter.Tk()
+        self.tabs = tkinter.ttk.Notebook(self.master)
+        self.master.protocol("WM_DELETE_WINDOW", self.close_window)
+        self.master.title("Lighting Desk")
+        self.master_editor_frame = tkinter.Frame(self.tabs)
+        self.editor_frame = tkinter.Frame(self.master_editor_frame)
+        self.tabs.add(self.master_editor_frame, text="Editor")
+        self.preset_frame = tkinter.Frame(self.tabs)
+        self.tabs.add(self.preset_frame, text="Presets")
+        self.cue_frame = tkinter.Frame(self.tabs)
+        self.tabs.add(self.cue_frame, text="Cues")
+        self.playback_frame = tkinter.Frame(self.tabs)
+        self.tabs.add(self.playback_frame, text="Playbacks")
+        self.playback_labels = []
+        self.key_editor_mode = False
+        self.key_editor_frame = tkinter.Frame(self.master_editor_frame)
+        self.key_display_frame = tkinter.Frame(self.master_editor_frame)
+        self.keys = []
+        self.keys_text = []
+        keys_list = self.storage.get_lighting_keys()
+        self.key_names = list(keys_list) + [''] * (self.channel_count - len(keys_list))
+        self.preset_name_list = []
+        self.preset_list = []
+        self.load_preset_dict(self.storage.get_preset_dict())
+        self.preset_index = 0
+        self.preset_entry = self.reset_button = self.blackout_button = self.preset_entry_text = None
+        self.preset_box_length = 5
+        self.preset_saver = self.preset_loader = self.clear_button = self.name_field = self.name_field_text = None
+        self.slider_list = []
+        self.manual_entry_list = []
+        self.entry_list = []
+        self.channel_button_list = []
+        self.preset_slider_list = []
+        self.preset_slider_values = []
+        self.preset_label_list = []
+        # The preset browser only draws the tiles in view; previews are rendered on first sight and cached.
+        self.preset_tile_size = (170, 52)
+        self.preset_preview_size = (96, 20)
+        self.preset_previews = PreviewCache(self.render_preset_preview)
+        self.preset_search = None
+        self.preset_search_text = tkinter.StringVar(value='')
+        self.preset_matches = []
+        self.preset_top_row = 0
+        self.preset_canvas = self.preset_scrollbar = None
+        self.page_label = None
+        self.blackout_value = False
+        # Widgets follow the desk in one batched pass per display frame. The values they show are cached,
+        # so the Scale commands and traces fired by those programmatic sets can tell they are not input.
+        self.view_period = 33
+        self.view_version = None
+        self.updating_view = False
+        self.shown_levels = []
+        self.shown_grand_master = 255
+        self.grand_master = self.grand_master_manual_entry = None
+        self.grand_master_manual_stringvar = tkinter.StringVar(value='255')
+        self.grand_master_manual_stringvar.trace('w', self.limit_manual_entry_size)
+        self.left_button = self.copy_button = self.paste_button = None
+        self.fade_in_text = tkinter.StringVar(value=str(self.storage.read_variable('fade_in') or 0))
+        self.fade_out_text = tkinter.StringVar(value=str(self.storage.read_variable('fade_out') or 0))
+        self.fade_curve = tkinter.StringVar(value=self.storage.read_variable('fade_curve') or 'linear')
+        self.effect_waveform = tkinter.StringVar(value='sine')
+        self.effect_rate_text = tkinter.StringVar(value='1')
+        self.effect_spread_text = tkinter.StringVar(value='1')
+        self.create_editor_frame()
+        self.create_preset_frame()
+        self.cue_list = [cues.Cue.from_dict(cue) for cue in self.storage.read_variable('cue_list') or []]
+        self.cue_listbox = None
+        self.cue_wait_text = tkinter.StringVar(value='0')
+        self.cue_follow_text = tkinter.StringVar(value='')
+        self.chase_bpm_text = tkinter.StringVar(value='120')
+        self.tapped_tempo = audio.TapTempo()
+        self.chase_crossfade_text = tkinter.StringVar(value='0')
+        self.create_cue_frame()
+        self.compile_cue_list()
+        self.create_playback_frame()
+        self.show_page(0)
+        self.refresh_view()
+        pad = 3
+        self._geom = '200x200+0+0'
+        self.master.geometry("{0}x{1}+0+0".format(
+            self.master.winfo_screenwidth() - pad, self.master.winfo_screenheight() - pad))
+        self.master.bind('<Escape>', self.shrink_window)
+        self.master.bind('<Prior>', lambda event: self.show_page(self.page - 1))
+        self.master.bind('<Next>', lambda event: self.show_page(self.page + 1))
+        self.editor_frame.grid(row=0, column=0)
+        self.tabs.pack()
+        self.status_bar = tkinter.Label(self.master, anchor='w', font='TkFixedFont')
+        self.status_bar_visible = False
+        self.master.bind('<F8>', self.tap_tempo)
+        self.master.bind('<F12>', self.toggle_status_bar)
+        if self.storage.read_variable('show_performance'):
+            self.toggle_status_bar()
+
+    def write_keys_list(self):
+        for channel, key in zip(self.page_channels(), self.keys_text):
+            self.key_names[channel] = key.get()
+        self.storage.write_lighting_keys(self.key_names)
+
+    def shrink_window(self):
+        geom = self.master.winfo_geometry()
+        self.master.geometry(self._geom)
+        self._geom = geom
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.save_preset_dict()
+
+    def toggle_status_bar(self, event=None):
+        self.status_bar_visible = not self.status_bar_visible
+        if self.status_bar_visible:
+            self.status_bar.pack(side=tkinter.BOTTOM, fill=tkinter.X)
+            self.update_status_bar()
+        else:
+            self.status_bar.pack_forget()
+
+    def update_status_bar(self):
+        if not self.status_bar_visible:
+            return
+        stats = self.core.output.stats()
+        stages = self.core.output.profiler.summary()
+        text = "FPS {:5.1f}  jitter {:5.2f} ms  worst tick {:6.2f} ms  USB errors {:4.1f}/s".format(
+            stats['fps'], stats['jitter'] * 1000, stages.get('tick', {}).get('max_ms', 0.0),
+            stats.get('errors_per_second', 0.0))
+        if 'output_jitter' in stats:
+            text += "  output process FPS {:5.1f} jitter {:5.2f} ms".format(stats['output_fps'],
+                                                                          stats['output_jitter'] * 1000)
+        for stage in ('input', 'compose', 'submit', 'transfer', 'audio'):
+            if stage in stages:
+                text += "  {} {:.2f}/{:.2f} ms".format(stage, stages[stage]['mean_ms'], stages[stage]['max_ms'])
+        bpm = self.audio.stats()['bpm'] if self.audio is not None else None
+        if bpm:
+            text += "  {:.1f} BPM".format(bpm)
+        self.status_bar.config(text=text)
+        self.master.after(500, self.update_status_bar)
+
+    def tap_tempo(self, event=None):
+        # Tapped beats retime the running chase; Release stops it.
+        now = time.perf_counter()
+        if self.audio is not None:
+            self.audio.tap(now)
+        bpm = self.tapped_tempo.tap(now)
+        if bpm is not None:
+            self.chase_bpm_text.set('{:.1f}'.format(bpm))
+            self.core.set_chase_tempo(bpm, now)
+
+    def close_window(self):
+        if self.audio is not None:
+            self.audio.stop()
+        self.core.output.stop()
+        self.save_preset_dict()
+        self.storage.close()
+        self.master.destroy()
+        exit()
+
+    def make_preset_dict(self):
+        preset_dictionary = {}
+        for i in range(len(self.preset_name_list)):
+            if self.preset_name_list[i] is '':
+                name = str(i)
+            else:
+                name = self.preset_name_list[i]
+            preset_dictionary[name] = (i, self.preset_list[i])
+        return preset_dictionary
+
+    def save_preset_dict(self):
+        preset_dict = self.make_preset_dict()
+        self.storage.write_preset_dict(preset_dict)
+        fade_in, fade_out = self.fade_times()
+        self.storage.write_variable('fade_in', fade_in)
+        self.storage.write_variable('fade_out', fade_out)
+        self.storage.write_variable('fade_curve', self.fade_curve.get())
+
+    def load_preset_dict(self, preset_dictionary):
+        name_list = [None] * len(preset_dictionary.keys())
+        preset_list = [None] * len(preset_dictionary.keys())
+        for name in preset_dictionary.keys():
+            index = preset_dictionary[name][0]
+            if name == str(index):
+                name_list[index] = ''
+            else:
+                name_list[index] = name
+            preset_list[index] = preset_dictionary[name][1]
+        self.preset_name_list = name_list
+        self.preset_list = preset_list
+
+    def create_editor_frame(self):
+        validate_command = (self.editor_frame.register(self.integer_verify),
+                            '%d', '%i', '%P', '%s', '%S', '%v', '%V', '%W')
+        for i in range(self.page_size):
+            self.manual_entry_list.append(tkinter.StringVar(value='0'))
+            self.manual_entry_list[i].trace('w', self.limit_manual_entry_size)
+            text_field = tkinter.Entry(self.editor_frame, validate='key', validatecommand=validate_command, width=3,
+                                       textvariable=self.manual_entry_list[i])
+            text_field.bind("<BackSpace>", self.backspace_handle)
+            text_field.grid(row=0, column=i)
+            self.entry_list.append(text_field)
+            self.slider_list.append(tkinter.Scale(self.editor_frame, from_=255, to=0, width=20, length=200,
+                                                  command=lambda value, number=i: self.slider_moved(number, value)))
+            self.slider_list[i].grid(row=1, column=i, ipadx=5)
+            self.shown_levels.append(0)
+            button = tkinter.Button(self.editor_frame, text=str(i+1))
+            button.grid(row=2, column=i)
+            button.bind('<ButtonPress-1>', lambda y,number=i: self.trigger_light(number, True))
+            button.bind('<ButtonRelease-1>', lambda y,number=i: self.trigger_light(number, False))
+            self.channel_button_list.append(button)
+        self.grand_master = tkinter.Scale(self.editor_frame, from_=255, to=0, width=25, length=200,
+                                          command=self.grand_master_moved)
+        self.grand_master.set(255)
+        self.grand_master.grid(row=1, column=self.page_size+1, ipadx=10)
+        self.blackout_button = tkinter.Label(self.editor_frame, text=str("BlackOut"))
+        self.blackout_button.grid(row=2, column=self.page_size+1)
+        self.blackout_button.bind('<ButtonPress-1>', lambda y: self.blackout())
+        self.blackout_button.config(relief="raised")
+        self.grand_master_manual_entry = tkinter.Entry(self.editor_frame, validate='key', validatecommand=validate_command,
+                                                       width=3, textvariable=self.grand_master_manual_stringvar)
+        self.grand_master_manual_entry.bind("<BackSpace>", self.backspace_handle)
+        self.grand_master_manual_entry.grid(row=0, column=self.page_size+1)
+        self.make_editor_preset_buttons(validate_command)
+        tkinter.Button(self.editor_frame, text="<<", command=lambda: self.show_page(self.page - 1)).grid(row=7, column=0)
+        self.page_label = tkinter.Label(self.editor_frame)
+        self.page_label.grid(row=7, column=1, columnspan=4)
+        tkinter.Button(self.editor_frame, text=">>", command=lambda: self.show_page(self.page + 1)).grid(row=7, column=5)
+        tkinter.OptionMenu(self.editor_frame, self.effect_waveform, *effects.WAVEFORMS.keys()).grid(
+            row=7, column=6, columnspan=3)
+        tkinter.Label(self.editor_frame, text="Rate").grid(row=7, column=9)
+        tkinter.Entry(self.editor_frame, width=5, textvariable=self.effect_rate_text).grid(row=7, column=10)
+        tkinter.Label(self.editor_frame, text="Spread").grid(row=7, column=11)
+        tkinter.Entry(self.editor_frame, width=5, textvariable=self.effect_spread_text).grid(row=7, column=12)
+        tkinter.Button(self.editor_frame, text="Effect", command=self.start_effect).grid(row=7, column=13, columnspan=2)
+        tkinter.Button(self.editor_frame, text="Stop FX", command=self.core.stop_effect).grid(
+            row=7, column=15, columnspan=2)
+
+    def start_effect(self):
+        # Runs on every channel of the page, with the phases spread across their fixtures.
+        channels = [channel + 1 for channel in self.page_channels()]
+        self.core.start_effect(self.effect_waveform.get(), self.core.patch.groups(channels),
+                               self.read_number(self.effect_rate_text, 1.0),
+                               spread=self.read_number(self.effect_spread_text, 1.0))
+
+    def page_channels(self):
+        start = self.page * self.page_size
+        return range(start, min(start + self.page_size, self.channel_count))
+
+    def show_page(self, page):
+        if self.keys:
+            if self.key_editor_mode:
+                self.write_keys_list()
+            self.kill_all_keys()
+        page_count = (self.channel_count + self.page_size - 1) // self.page_size
+        self.page = page % page_count
+        channels = self.page_channels()
+        for i in range(self.page_size):
+            widgets = (self.entry_list[i], self.slider_list[i], self.channel_button_list[i],
+                       self.preset_slider_list[i], self.preset_label_list[i])
+            if i < len(channels):
+                for widget in widgets:
+                    widget.grid()
+                self.channel_button_list[i].config(text=str(channels[i] + 1))
+                self.preset_label_list[i].config(text=str(channels[i] + 1))
+            else:
+                for widget in widgets:
+                    widget.grid_remove()
+        self.page_label.config(text="Channels {}-{} of {}".format(channels[0] + 1, channels[-1] + 1,
+                                                                  self.channel_count))
+        self.shown_levels = [None] * self.page_size
+        self.apply_view()
+        self.update_preset_sliders()
+        if self.key_editor_mode:
+            self.create_keys_editor()
+        else:
+            self.create_keys_display()
+
+    def create_keys_editor(self):
+        channels = self.page_channels()
+        self.keys_text = []
+        row = 0
+        for i, channel in enumerate(channels):
+            key_label = tkinter.Label(self.key_editor_frame, text="{}:".format(channel+1))
+            self.keys_text.append(tkinter.StringVar(value=self.key_names[channel]))
+            text_field = tkinter.Entry(self.key_editor_frame, width=50, textvariable=self.keys_text[i])
+            if i < (len(channels) + 1) // 2:
+                column = 0
+                row = i
+            else:
+                column = 2
+                row = i - (len(channels) + 1) // 2
+            key_label.grid(row=row, column=column)
+            text_field.grid(row=row, column=column+1)
+            self.keys.append(key_label)
+            self.keys.append(text_field)
+        save_button = tkinter.Button(self.key_editor_frame, text='Save', command=self.swap_keys_mode)
+        save_button.grid(row=row+1, column=3)
+        self.keys.append(save_button)
+        self.key_editor_frame.grid(row=1, column=0)
+        self.key_editor_mode = True
+
+    def create_keys_display(self):
+        channels = self.page_channels()
+        for i, channel in enumerate(channels):
+            key_text = "{}: {}".format(channel+1, self.key_names[channel] or self.core.patch.label(channel)).ljust(50)
+            key = tkinter.Label(self.key_display_frame, text=key_text, anchor='w')
+            if i < (len(channels) + 1) // 2:
+                column = 0
+                row = i
+            else:
+                column = 1
+                row = i - (len(channels) + 1) // 2
+            key.grid(row=row, column=column)
+            self.keys.append(key)
+        edit_button = tkinter.Button(self.key_display_frame, text='Edit', command=self.swap_keys_mode, anchor='w')
+        edit_button.grid(row=len(channels)+1, column=1)
+        self.keys.append(edit_button)
+        self.key_display_frame.grid(row=1, column=0)
+        self.key_editor_mode = False
+
+    def kill_all_keys(self):
+        for key in self.keys:
+            key.grid_forget()
+            key.destroy()
+        self.keys = []
+        self.key_editor_frame.grid_forget()
+        self.key_display_frame.grid_forget()
+
+    def swap_keys_mode(self):
+        if self.key_editor_mode:
+            self.write_keys_list()
+        self.kill_all_keys()
+        if self.key_editor_mode:
+            self.create_keys_display()
+        else:
+            self.create_keys_editor()
+
+    def blackout(self):
+        self.core.set_blackout(not self.core.blackout)
+        self.apply_view()
+
+    def refresh_view(self):
+        version = self.core.version
+        if version != self.view_version:
+            self.view_version = version
+            self.apply_view()
+        self.master.after(self.view_period, self.refresh_view)
+
+    def apply_view(self):
+        """
+        Bring the fader bank, grand master and blackout button in line with the desk, touching only the
+        widgets whose value changed.
+        """
+        self.updating_view = True
+        try:
+            for i, channel in enumerate(self.page_channels()):
+                level = self.core.levels[channel]
+                if level != self.shown_levels[i]:
+                    self.shown_levels[i] = level
+                    self.slider_list[i].set(level)
+                    self.manual_entry_list[i].set(level)
+            if self.core.grand_master != self.shown_grand_master:
+                self.shown_grand_master = self.core.grand_master
+                self.grand_master.set(self.shown_grand_master)
+                self.grand_master_manual_stringvar.set(self.shown_grand_master)
+            if self.core.blackout != self.blackout_value:
+                self.blackout_value = self.core.blackout
+                self.blackout_button.config(relief="sunken" if self.blackout_value else "raised")
+        finally:
+            self.updating_view = False
+
+    def trigger_light(self, number, toggle):
+        self.core.flash(self.page * self.page_size + number + 1, toggle)
+
+    def make_editor_preset_buttons(self, validate_command):
+        self.left_button = tkinter.Button(self.editor_frame, text="<", command=self.button_left)
+        self.left_button.grid(row=3, column=0)
+        self.preset_entry_text = tkinter.StringVar(value='0')
+        self.preset_entry_text.trace('w', self.limit_manual_entry_size)
+        self.preset_entry = tkinter.Entry(self.editor_frame, validate='key', validatecommand=validate_command,
+                                          width=self.preset_box_length, textvariable=self.preset_entry_text)
+        self.preset_entry.grid(row=3, column=1)
+        self.preset_entry.bind("<BackSpace>", self.backspace_handle)
+        self.left_button = tkinter.Button(self.editor_frame, text=">", command=self.button_right)
+        self.left_button.grid(row=3, column=2)
+        self.preset_saver = tkinter.Button(self.editor_frame, text="Save", command=self.save_preset)
+        self.preset_saver.grid(row=4, column=0)
+        self.preset_saver = tkinter.Button(self.editor_frame, text="Load", command=self.load_preset)
+        self.preset_saver.grid(row=4, column=1)
+        self.clear_button = tkinter.Button(self.editor_frame, text="Clear", command=self.clear_preset)
+        self.clear_button.grid(row=4, column=2)
+        self.copy_button = tkinter.Button(self.editor_frame, text="Copy", command=self.clear_preset)
+        self.copy_button.grid(row=3, column=6, columnspan=1, rowspan=2)
+        self.paste_button = tkinter.Button(self.editor_frame, text="Paste", command=self.clear_preset)
+        self.paste_button.grid(row=3, column=7, columnspan=1, rowspan=2)
+        for i in range(self.page_size):
+
+            self.preset_slider_list.append(tkinter.Scale(self.editor_frame, from_=255, to=0, width=20, length=100))
+            self.preset_slider_list[i].config(state=tkinter.DISABLED)
+            self.preset_slider_list[i].grid(row=5, column=i, ipadx=5, pady=10)
+            self.preset_slider_values.append(0)
+            label = tkinter.Label(self.editor_frame, text=str(i + 1))
+            label.grid(row=6, column=i)
+            self.preset_label_list.append(label)
+        self.name_field_text = tkinter.StringVar(value="")
+        self.name_field = tkinter.Entry(self.editor_frame, width=25, textvariable=self.name_field_text)
+        self.name_field.config(justify=tkinter.RIGHT)
+        self.name_field.grid(row=3, column=3, columnspan=3, rowspan=2)
+        self.reset_button = tkinter.Button(self.editor_frame, text="Fader Reset", command=self.fader_reset)
+        self.reset_button.grid(row=3, column=8, columnspan=2, rowspan=2)
+        tkinter.Label(self.editor_frame, text="Fade In").grid(row=3, column=10, columnspan=2)
+        tkinter.Entry(self.editor_frame, width=5, textvariable=self.fade_in_text).grid(row=4, column=10, columnspan=2)
+        tkinter.Label(self.editor_frame, text="Fade Out").grid(row=3, column=12, columnspan=2)
+        tkinter.Entry(self.editor_frame, width=5, textvariable=self.fade_out_text).grid(row=4, column=12, columnspan=2)
+        curve_menu = tkinter.OptionMenu(self.editor_frame, self.fade_curve, *fades.CURVES.keys())
+        curve_menu.grid(row=3, column=14, columnspan=3, rowspan=2)
+        try:
+            if not any(self.preset_list[self.preset_index]):
+                self.preset_entry.config({"background": "Red"})
+            elif self.preset_list[self.preset_index]:
+                self.preset_entry.config({"background": "Green"})
+        except IndexError:
+            self.preset_entry.config({"background": "Red"})
+
+    def fader_reset(self):
+        self.core.set_levels(1, bytes(self.channel_count))
+        self.apply_view()
+
+    def update_preset_sliders(self):
+        try:
+            slider_list_values = self.preset_list[self.preset_index]
+            self.name_field_text.set(self.preset_name_list[self.preset_index])
+        except IndexError:
+            slider_list_values = []
+            self.name_field_text.set("")
+        for i, channel in enumerate(self.page_channels()):
+            value = int(slider_list_values[channel]) if channel < len(slider_list_values or ()) else 0
+            if value != self.preset_slider_values[i]:
+                self.preset_slider_values[i] = value
+                self.preset_slider_list[i].config(state=tkinter.NORMAL)
+                self.preset_slider_list[i].set(value)
+                self.preset_slider_list[i].config(state=tkinter.DISABLED)
+
+    def button_left(self):
+        if self.preset_index == 0:
+            if len(self.preset_list) > 1:
+                self.preset_index = len(self.preset_list) - 1
+            else: self.preset_index = 0
+        else:
+            self.preset_index -= 1
+        if int(self.preset_entry_text.get()) != self.preset_index:
+            self.preset_entry_text.set(self.preset_index)
+        try:
+            if not any(self.preset_list[self.preset_index]):
+                self.preset_entry.config({"background": "Red"})
+            elif self.preset_list[self.preset_index]:
+                self.preset_entry.config({"background": "Green"})
+        except IndexError:
+            self.preset_entry.config({"background": "Red"})
+        self.update_preset_sliders()
+
+    def button_right(self):
+        maximum_number = '9' * self.preset_box_length
+        if self.preset_index + 1 > int(maximum_number):
+            self.preset_index = 0
+        else:
+            self.preset_index += 1
+        if int(self.preset_entry_text.get()) != self.preset_index:
+            self.preset_entry_text.set(self.preset_index)
+        try:
+            if not any(self.preset_list[self.preset_index]):
+                self.preset_entry.config({"background": "Red"})
+            elif self.preset_list[self.preset_index]:
+                self.preset_entry.config({"background": "Green"})
+        except IndexError:
+            self.preset_entry.config({"background": "Red"})
+        self.update_preset_sliders()
+
+    def save_preset(self):
+        slider_list_values = list(self.core.levels)
+        first_changed = min(self.preset_index, len(self.preset_list))
+        try:
+            self.preset_list[self.preset_index] = slider_list_values
+            self.preset_name_list[self.preset_index] = self.name_field_text.get()
+        except IndexError:
+            blank_slider_list = [0] * self.channel_count
+            for i in range(self.preset_index - len(self.preset_list) + 1):
+                self.preset_list.append(blank_slider_list)
+                self.preset_name_list.append("")
+            self.preset_list[self.preset_index] = slider_list_values
+            self.preset_name_list[self.preset_index] = self.name_field_text.get()
+        try:
+            if not any(self.preset_list[self.preset_index]):
+                self.preset_entry.config({"background": "Red"})
+            elif self.preset_list[self.preset_index]:
+                self.preset_entry.config({"background": "Green"})
+        except IndexError:
+            self.preset_entry.config({"background": "Red"})
+        self.update_preset_sliders()
+        for i in range(first_changed, self.preset_index + 1):
+            self.storage.write_preset(i, self.preset_name_list[i], self.preset_list[i])
+        self.presets_changed(range(first_changed, self.preset_index + 1))
+        self.compile_cue_list()
+        self.core.load_playbacks()
+
+    def clear_preset(self):
+        try:
+            self.preset_list[self.preset_index] = [0] * self.channel_count
+            self.preset_name_list[self.preset_index] = ''
+            self.name_field_text.set("")
+        except IndexError:
+            pass
+        try:
+            if not any(self.preset_list[self.preset_index]):
+                self.preset_entry.config({"background": "Red"})
+            elif self.preset_list[self.preset_index]:
+                self.preset_entry.config({"background": "Green"})
+        except IndexError:
+            self.preset_entry.config({"background": "Red"})
+        self.update_preset_sliders()
+        self.presets_changed([self.preset_index])
+
+    def fade_times(self):
+        return self.read_number(self.fade_in_text), self.read_number(self.fade_out_text)
+
+    def load_preset(self):
+        try:
+            slider_list_values = self.preset_list[self.preset_index]
+            self.name_field_text.set(self.preset_name_list[self.preset_index])
+        except IndexError:
+            slider_list_values = []
+        fade_in, fade_out = self.fade_times()
+        if fade_in or fade_out:
+            self.core.start_fade(fade_in, fade_out, self.fade_curve.get())
+        levels = [int(value) for value in slider_list_values or ()][:self.channel_count]
+        self.core.set_levels(1, levels + [0] * (self.channel_count - len(levels)))
+        self.apply_view()
+
+    def slider_moved(self, number, value):
+        started = time.perf_counter()
+        value = int(float(value))
+        channels = self.page_channels()
+        if number >= len(channels) or value == self.shown_levels[number]:
+            # Set by apply_view, not moved by hand.
+            return
+        self.shown_levels[number] = value
+        self.updating_view = True
+        try:
+            self.manual_entry_list[number].set(value)
+        finally:
+            self.updating_view = False
+        self.core.set_channel(channels[number] + 1, value)
+        self.core.output.profiler.record('input', time.perf_counter() - started)
+
+    def grand_master_moved(self, value):
+        value = int(float(value))
+        if value == self.shown_grand_master:
+            return
+        self.shown_grand_master = value
+        self.updating_view = True
+        try:
+            self.grand_master_manual_stringvar.set(value)
+        finally:
+            self.updating_view = False
+        self.core.set_grand_master(value)
+
+    def backspace_handle(self, event):
+        entry_field = self.editor_frame.focus_get()
+        value = str(entry_field.get())
+        if entry_field == self.grand_master_manual_entry:
+            if len(value) != 1:
+                self.grand_master_manual_stringvar.set(str(entry_field.get())[:len(value)])
+            else:
+                self.grand_master_manual_stringvar.set("0")
+            return
+        elif entry_field == self.preset_entry:
+            if len(value) != 1:
+                self.preset_entry_text.set(str(entry_field.get())[:len(value)])
+            else:
+                self.preset_entry_text.set("0")
+            return
+        index = self.entry_list.index(entry_field)
+        if len(value) != 1:
+            self.manual_entry_list[index].set(str(entry_field.get())[:len(value)])
+        else:
+            self.manual_entry_list[index].set("0")
+
+    @staticmethod
+    def integer_verify(action, index, value_if_allowed,
+                       prior_value, text, validation_type, trigger_type, widget_name):
+        if text in '0123456789':
+            try:
+                float(value_if_allowed)
+                return True
+            except ValueError:
+                return False
+        else:
+            return False
+
+    def limit_manual_entry_size(self, *args):
+        if self.updating_view:
+            return
+        entry_location = self.editor_frame.focus_get()
+        if entry_location in self.entry_list:
+            slider_no = self.entry_list.index(entry_location)
+            if int(self.slider_list[slider_no].get()) != int(entry_location.get()):
+                self.slider_list[slider_no].set(int(entry_location.get()))
+            if len(entry_location.get()) > 3:
+                self.manual_entry_list[slider_no].set(entry_location.get()[:3])
+            if str(entry_location.get()[0]) == "0" and len(entry_location.get()) > 1:
+                self.manual_entry_list[slider_no].set(entry_location.get()[1:])
+        if not int(self.grand_master_manual_stringvar.get()) == int(self.grand_master.get()):
+            self.grand_master.set(int(self.grand_master_manual_stringvar.get()))
+        if len(self.grand_master_manual_stringvar.get()) > 3:
+            self.grand_master_manual_stringvar.set(self.grand_master_manual_stringvar.get()[:3])
+        if str(self.grand_master_manual_stringvar.get())[0] == "0" and len(self.grand_master_manual_stringvar.get()) > 1:
+            self.grand_master_manual_stringvar.set(self.grand_master_manual_stringvar.get()[1:])
+        if entry_location == self.preset_entry:
+            if len(entry_location.get()) > self.preset_box_length - 1:
+                self.preset_entry_text.set(entry_location.get()[:self.preset_box_length])
+            if str(entry_location.get()[0]) == "0" and len(entry_location.get()) > 1:
+                self.preset_entry_text.set(entry_location.get()[1:])
+            if self.preset_index != int(entry_location.get()):
+                self.preset_index = int(entry_location.get())
+                try:
+                    if not any(self.preset_list[self.preset_index]):
+                        self.preset_entry.config({"background": "Red"})
+                    elif self.preset_list[self.preset_index]:
+                        self.preset_entry.config({"background": "Green"})
+                except IndexError:
+                    self.preset_entry.config({"background": "Red"})
+                self.update_preset_sliders()
+
+    def create_preset_frame(self):
+        tkinter.Label(self.preset_frame, text="Search").grid(row=0, column=0, sticky='e')
+        tkinter.Entry(self.preset_frame, width=30, textvariable=self.preset_search_text).grid(row=0, column=1,
+                                                                                            sticky='w')
+        self.preset_canvas = tkinter.Canvas(self.preset_frame, width=6 * self.preset_tile_size[0],
+                                            height=10 * self.preset_tile_size[1], background='black',
+                                            highlightthickness=0)
+        self.preset_canvas.grid(row=1, column=0, columnspan=2)
+        self.preset_scrollbar = tkinter.Scrollbar(self.preset_frame, orient=tkinter.VERTICAL,
+                                                  command=self.scroll_presets)
+        self.preset_scrollbar.grid(row=1, column=2, sticky='ns')
+        self.preset_canvas.bind('<Map>', lambda event: self.draw_preset_grid())
+        self.preset_canvas.bind('<Configure>', lambda event: self.draw_preset_grid())
+        self.preset_canvas.bind('<MouseWheel>', lambda event: self.scroll_presets('scroll', -event.delta // 120))
+        self.preset_canvas.bind('<Button-4>', lambda event: self.scroll_presets('scroll', -1))
+        self.preset_canvas.bind('<Button-5>', lambda event: self.scroll_presets('scroll', 1))
+        self.preset_canvas.bind('<Button-1>', self.preset_tile_clicked)
+        self.preset_canvas.bind('<Double-Button-1>', lambda event: self.load_preset())
+        self.preset_search_text.trace('w', lambda *args: self.search_presets())
+        self.filter_presets()
+
+    def render_preset_preview(self, index):
+        width, height = self.preset_preview_size
+        heights = [level * height // 255 for level in preview_columns(self.preset_list[index] or (), width)]
+        rows = ['{' + ' '.join('#ffc040' if bar >= height - y else '#303030' for bar in heights) + '}'
+                for y in range(height)]
+        image = tkinter.PhotoImage(width=width, height=height)
+        image.put(' '.join(rows))
+        return image
+
+    def presets_changed(self, indices):
+        for index in indices:
+            self.preset_previews.discard(index)
+        self.preset_search = None
+        self.filter_presets()
+
+    def search_presets(self):
+        self.preset_top_row = 0
+        self.filter_presets()
+
+    def filter_presets(self):
+        if self.preset_search is None:
+            self.preset_search = PresetIndex(self.preset_name_list,
+                                             [i for i, preset in enumerate(self.preset_list) if preset is not None])
+        self.preset_matches = self.preset_search.search(self.preset_search_text.get())
+        self.draw_preset_grid()
+
+    def preset_grid_size(self):
+        width, height = self.preset_tile_size
+        return (max(self.preset_canvas.winfo_width() // width, 1),
+                max(self.preset_canvas.winfo_height() // height, 1))
+
+    def draw_preset_grid(self):
+        canvas = self.preset_canvas
+        if canvas is None or not canvas.winfo_ismapped():
+            return
+        canvas.delete(tkinter.ALL)
+        columns, rows = self.preset_grid_size()
+        total_rows = -(-len(self.preset_matches) // columns)
+        self.preset_top_row = max(min(self.preset_top_row, total_rows - rows), 0)
+        width, height = self.preset_tile_size
+        first = self.preset_top_row * columns
+        for i, index in enumerate(self.preset_matches[first:first + columns * (rows + 1)]):
+            x, y = i % columns * width, i // columns * height
+            canvas.create_rectangle(x + 2, y + 2, x + width - 2, y + height - 2, fill='grey15',
+                                    outline='yellow' if index == self.preset_index else 'grey30')
+            canvas.create_text(x + 6, y + 5, anchor=tkinter.NW, fill='white',
+                               text="{} {}".format(index, self.preset_name_list[index] or '')[:24])
+            canvas.create_image(x + 6, y + height - 6, anchor=tkinter.SW, image=self.preset_previews.get(index))
+        if total_rows:
+            self.preset_scrollbar.set(self.preset_top_row / total_rows,
+                                      min((self.preset_top_row + rows) / total_rows, 1.0))
+        else:
+            self.preset_scrollbar.set(0.0, 1.0)
+
+    def scroll_presets(self, action, amount, unit='units'):
+        columns, rows = self.preset_grid_size()
+        if action == 'moveto':
+            self.preset_top_row = int(float(amount) * -(-len(self.preset_matches) // columns))
+        else:
+            self.preset_top_row += int(amount) * (rows if unit == 'pages' else 1)
+        self.draw_preset_grid()
+
+    def preset_tile_clicked(self, event):
+        columns, _ = self.preset_grid_size()
+        column = event.x // self.preset_tile_size[0]
+        position = (self.preset_top_row + event.y // self.preset_tile_size[1]) * columns + column
+        if column < columns and position < len(self.preset_matches):
+            self.preset_index = self.preset_matches[position]
+            self.preset_entry_text.set(self.preset_index)
+            if self.preset_list[self.preset_index] and any(self.preset_list[self.preset_index]):
+                self.preset_entry.config({"background": "Green"})
+            else:
+                self.preset_entry.config({"background": "Red"})
+            self.update_preset_sliders()
+            self.draw_preset_grid()
+
+    def create_cue_frame(self):
+        self.cue_listbox = tkinter.Listbox(self.cue_frame, width=60, height=20)
+        self.cue_listbox.grid(row=0, column=0, columnspan=6)
+        tkinter.Label(self.cue_frame, text="Wait").grid(row=1, column=0)
+        tkinter.Entry(self.cue_frame, width=5, textvariable=self.cue_wait_text).grid(row=1, column=1)
+        tkinter.Label(self.cue_frame, text="Follow").grid(row=1, column=2)
+        tkinter.Entry(self.cue_frame, width=5, textvariable=self.cue_follow_text).grid(row=1, column=3)
+        tkinter.Button(self.cue_frame, text="Add Cue", command=self.add_cue).grid(row=1, column=4)
+        tkinter.Button(self.cue_frame, text="Remove Cue", command=self.remove_cue).grid(row=1, column=5)
+        tkinter.Button(self.cue_frame, text="GO", command=self.cue_go).grid(row=2, column=0)
+        tkinter.Button(self.cue_frame, text="Back", command=self.cue_back).grid(row=2, column=1)
+        tkinter.Button(self.cue_frame, text="Release", command=self.cue_release).grid(row=2, column=2)
+        tkinter.Label(self.cue_frame, text="BPM").grid(row=3, column=0)
+        tkinter.Entry(self.cue_frame, width=5, textvariable=self.chase_bpm_text).grid(row=3, column=1)
+        tkinter.Label(self.cue_frame, text="Crossfade").grid(row=3, column=2)
+        tkinter.Entry(self.cue_frame, width=5, textvariable=self.chase_crossfade_text).grid(row=3, column=3)
+        tkinter.Button(self.cue_frame, text="Chase", command=self.start_chase).grid(row=3, column=4)
+        self.refresh_cue_listbox()
+
+    def create_playback_frame(self):
+        for i, fader in enumerate(self.core.mixer.faders):
+            slider = tkinter.Scale(self.playback_frame, from_=255, to=0, width=20, length=200,
+                                   command=lambda value, number=i: self.core.set_playback_level(number, float(value)))
+            slider.set(fader.level)
+            slider.grid(row=0, column=i, ipadx=5)
+            label = tkinter.Label(self.playback_frame, text=fader.describe(), width=10)
+            label.grid(row=1, column=i)
+            self.playback_labels.append(label)
+            tkinter.Button(self.playback_frame, text="Preset",
+                           command=lambda number=i: self.assign_playback(number, preset=self.preset_index)).grid(
+                row=2, column=i)
+            tkinter.Button(self.playback_frame, text="Cue",
+                           command=lambda number=i: self.assign_playback_cue(number)).grid(row=3, column=i)
+            tkinter.Button(self.playback_frame, text="Clear",
+                           command=lambda number=i: self.assign_playback(number)).grid(row=4, column=i)
+
+    def assign_playback(self, number, preset=None, cue=None):
+        self.core.assign_playback(number, preset, cue)
+        self.playback_labels[number].config(text=self.core.mixer.faders[number].describe())
+
+    def assign_playback_cue(self, number):
+        selection = self.cue_listbox.curselection()
+        if selection:
+            self.assign_playback(number, cue=selection[0])
+
+    def refresh_cue_listbox(self):
+        self.cue_listbox.delete(0, tkinter.END)
+        for i, cue in enumerate(self.cue_list):
+            follow = "manual" if cue.follow is None else "{}s".format(cue.follow)
+            self.cue_listbox.insert(tkinter.END, "{}: preset {}  in {}s  out {}s  wait {}s  follow {}".format(
+                i + 1, cue.preset, cue.fade_in, cue.fade_out, cue.wait, follow))
+
+    @staticmethod
+    def read_number(text, default=0.0):
+        try:
+            return max(float(text.get()), 0.0)
+        except ValueError:
+            return default
+
+    def add_cue(self):
+        fade_in, fade_out = self.fade_times()
+        follow = self.read_number(self.cue_follow_text, None)
+        self.cue_list.append(cues.Cue(self.preset_index, fade_in, fade_out, self.read_number(self.cue_wait_text),
+                                      follow, self.fade_curve.get()))
+        self.save_cue_list()
+
+    def remove_cue(self):
+        for index in reversed(self.cue_listbox.curselection()):
+            del self.cue_list[index]
+        self.save_cue_list()
+
+    def save_cue_list(self):
+        self.storage.write_variable('cue_list', [cue.to_dict() for cue in self.cue_list])
+        self.refresh_cue_listbox()
+        self.compile_cue_list()
+        self.core.load_playbacks()
+
+    def compile_cue_list(self):
+        self.core.playback.load_cue_list(self.cue_list, self.preset_list)
+        self.core.update()
+
+    def show_cue_position(self):
+        self.cue_listbox.selection_clear(0, tkinter.END)
+        if self.core.playback.cue_index is not None:
+            self.cue_listbox.selection_set(self.core.playback.cue_index)
+
+    def cue_go(self):
+        self.core.go()
+        self.show_cue_position()
+
+    def cue_back(self):
+        self.core.back()
+        self.show_cue_position()
+
+    def cue_release(self):
+        self.core.release()
+        self.show_cue_position()
+
+    def start_chase(self):
+        preset_indices = [i for i, preset in enumerate(self.preset_list) if preset and any(preset)]
+        bpm = self.read_number(self.chase_bpm_text, 120.0) or 120.0
+        crossfade = self.read_number(self.chase_crossfade_text)
+        if preset_indices:
+            self.core.playback.load_chase(preset_indices, self.preset_list, bpm, crossfade, time.perf_counter())
+            self.core.output.wake()
+
+    def run(self):
+        self.core.output.start()
+        self.master.mainloop()
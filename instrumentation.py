@@ -0,0 +1,82 @@
+import csv
+import json
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+
+
+class Profiler:
+    """
+    Per-stage timers for the output hot path. Every stage keeps a ring buffer of its most
+    recent durations, so the cost of recording stays constant however long the show runs.
+
+    with profiler.stage('compose'):
+        ...
+    """
+    def __init__(self, capacity: int = 2000):
+        self.capacity = capacity
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, duration: float) -> None:
+        """
+        :param stage: stage name, e.g. 'input', 'compose', 'transfer' or 'tick'
+        :param duration: seconds
+        """
+        samples = self.samples.get(stage)
+        if samples is None:
+            with self._lock:
+                samples = self.samples.setdefault(stage, deque(maxlen=self.capacity))
+        samples.append((time.time(), duration))
+
+    @contextmanager
+    def stage(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def durations(self, stage: str) -> list:
+        return [duration for _, duration in list(self.samples.get(stage, ()))]
+
+    def summary(self) -> dict:
+        """
+        :return: {stage: {'count', 'mean_ms', 'p95_ms', 'max_ms'}} over the ring buffers
+        """
+        summary = {}
+        for stage in list(self.samples):
+            durations = sorted(self.durations(stage))
+            if not durations:
+                continue
+            summary[stage] = {'count': len(durations),
+                              'mean_ms': sum(durations) / len(durations) * 1000,
+                              'p95_ms': durations[min(int(len(durations) * 0.95), len(durations) - 1)] * 1000,
+                              'max_ms': durations[-1] * 1000}
+        return summary
+
+    def trace(self) -> list:
+        """
+        :return: every buffered sample as (timestamp, stage, duration in seconds), oldest first
+        """
+        rows = [(timestamp, stage, duration) for stage in list(self.samples)
+                for timestamp, duration in list(self.samples[stage])]
+        return sorted(rows)
+
+    def export(self, path: str) -> None:
+        """
+        Write the buffered samples to a CSV file, or to JSON if the path ends in .json.
+        """
+        rows = self.trace()
+        with open(path, 'w', newline='') as trace_file:
+            if path.endswith('.json'):
+                json.dump({'samples': [{'timestamp': timestamp, 'stage': stage, 'duration_ms': duration * 1000}
+                                       for timestamp, stage, duration in rows],
+                           'summary': self.summary()}, trace_file, indent=2)
+            else:
+                writer = csv.writer(trace_file)
+                writer.writerow(('timestamp', 'stage', 'duration_ms'))
+                for timestamp, stage, duration in rows:
+                    writer.writerow((timestamp, stage, duration * 1000))
@@ -0,0 +1,95 @@
+import random
+import threading
+import time
+
+from collections import deque
+
+from pyUDMX import TransferError
+
+SET_SINGLE_CHANNEL = 1
+SET_MULTI_CHANNEL = 2
+
+
+class LoopbackDevice:
+    """
+    A simulated uDMX interface. It keeps the universe it has been sent, records every
+    transfer with its completion time and can add latency and failures to transfers.
+    """
+    def __init__(self, bus: int, address: int, latency: float = 0.0, failure_rate: float = 0.0,
+                 record_limit: int = 100000, seed: int = None):
+        self.bus = bus
+        self.address = address
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.plugged = True
+        self.universe = bytearray(512)
+        self.transfers = deque(maxlen=record_limit)
+        self.transfer_count = 0
+        self.bytes_received = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def ctrl_transfer(self, bmRequestType: int, bRequest: int, wValue: int = 0, wIndex: int = 0,
+                      data_or_wLength=None, timeout=None) -> int:
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.plugged:
+            raise TransferError("No such device (loopback device unplugged)")
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.failures += 1
+            raise TransferError("Simulated transfer failure")
+        if bRequest == SET_SINGLE_CHANNEL:
+            data = bytes([wValue])
+        elif bRequest == SET_MULTI_CHANNEL:
+            data = bytes(data_or_wLength[:wValue])
+        else:
+            raise TransferError("Unsupported request {}".format(bRequest))
+        with self._lock:
+            self.universe[wIndex:wIndex + len(data)] = data
+            self.transfers.append((time.perf_counter(), wIndex + 1, data))
+            self.transfer_count += 1
+            self.bytes_received += len(data)
+        return wValue if bRequest == SET_MULTI_CHANNEL else 1
+
+
+class LoopbackTransport:
+    """
+    A transport for pyUDMX.uDMXDevice that enumerates LoopbackDevices instead of USB interfaces.
+
+    transport = LoopbackTransport(device_count=2, latency=0.001)
+    device = pyUDMX.uDMXDevice(transport)
+    device.open()
+    """
+    def __init__(self, device_count: int = 1, latency: float = 0.0, failure_rate: float = 0.0, seed: int = None,
+                 vendor_id: int = 0x16c0, product_id: int = 0x5dc):
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.devices = [LoopbackDevice(1, address, latency, failure_rate,
+                                       seed=None if seed is None else seed + address)
+                        for address in range(2, device_count + 2)]
+
+    def find(self, find_all: bool = False, idVendor: int = None, idProduct: int = None, bus: int = None,
+             address: int = None):
+        matches = [device for device in self.devices if device.plugged
+                   and idVendor in (None, self.vendor_id) and idProduct in (None, self.product_id)
+                   and bus in (None, device.bus) and address in (None, device.address)]
+        if find_all:
+            return matches
+        return matches[0] if matches else None
+
+    def dispose(self, device) -> None:
+        pass
+
+    def unplug(self, index: int) -> None:
+        self.devices[index].plugged = False
+
+    def plug(self, index: int, address: int = None) -> None:
+        """
+        :param address: new bus address, as a real interface usually gets when replugged
+        """
+        device = self.devices[index]
+        if address is not None:
+            device.address = address
+        device.universe[:] = bytes(len(device.universe))
+        device.plugged = True
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import socket
+import struct
+import threading
+import time
+
+import effects
+import fades
+
+logger = logging.getLogger(__name__)
+
+ARTNET_PORT = 6454
+SACN_PORT = 5568
+OSC_PORT = 7700
+
+ARTNET_HEADER = b'Art-Net\x00'
+ARTNET_OP_DMX = 0x5000
+ACN_IDENTIFIER = b'ASC-E1.17\x00\x00\x00'
+SACN_OPTION_PREVIEW = 0x80
+
+
+def parse_artnet(packet: bytes):
+    """
+    :return: (universe, channel data) for an ArtDmx packet, otherwise None
+    """
+    if len(packet) < 18 or packet[:8] != ARTNET_HEADER:
+        return None
+    if struct.unpack_from('<H', packet, 8)[0] != ARTNET_OP_DMX:
+        return None
+    universe = struct.unpack_from('<H', packet, 14)[0] & 0x7fff
+    length = struct.unpack_from('>H', packet, 16)[0]
+    return universe, packet[18:18 + length]
+
+
+def parse_sacn(packet: bytes):
+    """
+    :return: (universe counted from 0, channel data) for an E1.31 data packet, otherwise None
+    """
+    if len(packet) < 126 or packet[4:16] != ACN_IDENTIFIER:
+        return None
+    if struct.unpack_from('>I', packet, 18)[0] != 0x4 or struct.unpack_from('>I', packet, 40)[0] != 0x2:
+        return None
+    if packet[112] & SACN_OPTION_PREVIEW or packet[125] != 0:
+        # Preview data is meant for visualisers, and a non-zero start code is not dimmer data.
+        return None
+    universe = struct.unpack_from('>H', packet, 113)[0]
+    count = struct.unpack_from('>H', packet, 123)[0]
+    return universe - 1, packet[126:125 + count]
+
+
+def _read_osc_string(packet: bytes, offset: int):
+    end = packet.index(b'\x00', offset)
+    return packet[offset:end].decode('ascii', 'replace'), (end + 4) & ~3
+
+
+def parse_osc(packet: bytes) -> list:
+    """
+    :return: list of (address, arguments) for an OSC message or bundle
+    """
+    if packet.startswith(b'#bundle\x00'):
+        messages = []
+        offset = 16
+        while offset + 4 <= len(packet):
+            size = struct.unpack_from('>i', packet, offset)[0]
+            messages.extend(parse_osc(packet[offset + 4:offset + 4 + size]))
+            offset += 4 + size
+        return messages
+    address, offset = _read_osc_string(packet, 0)
+    if offset >= len(packet):
+        return [(address, [])]
+    tags, offset = _read_osc_string(packet, offset)
+    arguments = []
+    for tag in tags[1:]:
+        if tag == 'i':
+            arguments.append(struct.unpack_from('>i', packet, offset)[0])
+            offset += 4
+        elif tag == 'f':
+            arguments.append(struct.unpack_from('>f', packet, offset)[0])
+            offset += 4
+        elif tag == 's':
+            value, offset = _read_osc_string(packet, offset)
+            arguments.append(value)
+        elif tag in 'TF':
+            arguments.append(tag == 'T')
+    return [(address, arguments)]
+
+
+def osc_level(value) -> int:
+    """
+    Integers are DMX levels 0-255, floats are fader positions 0.0-1.0 as sent by most OSC surfaces.
+    """
+    if isinstance(value, float):
+        value = round(value * 255)
+    return min(max(int(value), 0), 255)
+
+
+class NetworkInput:
+    """
+    Holds the latest Art-Net/sACN frame of every universe as an output engine source. Slots
+    patched to LTP attributes (pan, tilt, colour...) replace the desk output as they are;
+    every other slot follows the desk's master and is merged highest-takes-precedence.
+    """
+    timeout = 2.5
+
+    def __init__(self, core):
+        self.core = core
+        self.universe_count = core.output.universes.universe_count
+        self.frames = {}
+        patch = core.patch
+        count = len(patch.channels)
+        self.ltp = {universe: bytes(0 if channel >= count or patch.htp[channel] else 255 for channel in index)
+                    for universe, index in patch.index.items()}
+        self.ltp = {universe: mask for universe, mask in self.ltp.items() if any(mask)}
+
+    def receive(self, universe: int, data: bytes) -> None:
+        if 0 <= universe < self.universe_count:
+            self.frames[universe] = (time.perf_counter(), bytes(data[:512]))
+            self.core.output.wake()
+
+    def render(self, now: float) -> dict:
+        master = self.core.master
+        frames = {}
+        for universe, (received, frame) in list(self.frames.items()):
+            if now - received >= self.timeout:
+                continue
+            scaled = fades.scale(frame, master)
+            mask = self.ltp.get(universe)
+            if mask is None:
+                frames[universe] = scaled
+                continue
+            size = len(frame)
+            ltp = int.from_bytes(mask[:size], 'big')
+            values = (int.from_bytes(scaled, 'big') & ~ltp) | (int.from_bytes(frame, 'big') & ltp)
+            frames[universe] = (values.to_bytes(size, 'big'), ltp)
+        return frames
+
+
+class _DatagramHandler(asyncio.DatagramProtocol):
+    def __init__(self, handler):
+        self.handler = handler
+
+    def datagram_received(self, data, address):
+        try:
+            self.handler(data)
+        except (ValueError, TypeError, IndexError, struct.error) as error:
+            logger.debug("Ignoring malformed packet from %s: %s", address, error)
+
+
+class NetworkServer:
+    """
+    Local network control for a DeskCore: Art-Net and sACN DMX input, and OSC commands.
+
+    OSC addresses:
+        /channel <channel> <level>, /channel/<channel> <level>
+        /master <level>
+        /submaster/<name> <level>
+        /playback/<number> <level>
+        /blackout <0|1>
+        /preset <index> [fade in] [fade out]
+        /go, /back, /release
+        /effect <waveform> <first channel> <last channel> [rate] [size] [spread], /effect/stop [id]
+    Levels are integers 0-255 or floats 0.0-1.0.
+    """
+    def __init__(self, core, host: str = '0.0.0.0', artnet_port: int = ARTNET_PORT, sacn_port: int = SACN_PORT,
+                 osc_port: int = OSC_PORT):
+        self.core = core
+        self.host = host
+        self.artnet_port = artnet_port
+        self.sacn_port = sacn_port
+        self.osc_port = osc_port
+        self.input = NetworkInput(core)
+        core.output.add_source(self.input)
+        self.transports = []
+
+    def handle_artnet(self, packet: bytes) -> None:
+        frame = parse_artnet(packet)
+        if frame is not None:
+            self.input.receive(*frame)
+
+    def handle_sacn(self, packet: bytes) -> None:
+        frame = parse_sacn(packet)
+        if frame is not None:
+            self.input.receive(*frame)
+
+    def handle_osc(self, packet: bytes) -> None:
+        for address, arguments in parse_osc(packet):
+            self.osc_command(address.rstrip('/').split('/')[1:], arguments)
+
+    def osc_command(self, path: list, arguments: list) -> None:
+        command = path[0] if path else ''
+        if command == 'channel' and len(path) == 2 and arguments:
+            self.core.set_channel(int(path[1]), osc_level(arguments[0]))
+        elif command == 'channel' and len(arguments) >= 2:
+            self.core.set_channel(int(arguments[0]), osc_level(arguments[1]))
+        elif command == 'master' and arguments:
+            self.core.set_grand_master(osc_level(arguments[0]))
+        elif command == 'submaster' and len(path) == 2 and arguments:
+            self.core.set_submaster(path[1], osc_level(arguments[0]))
+        elif command == 'playback' and len(path) == 2 and arguments:
+            self.core.set_playback_level(int(path[1]) - 1, osc_level(arguments[0]))
+        elif command == 'blackout':
+            self.core.set_blackout(bool(arguments[0]) if arguments else not self.core.blackout)
+        elif command == 'preset' and arguments:
+            times = [float(argument) for argument in arguments[1:3]]
+            if not self.core.recall_preset(int(arguments[0]), *times):
+                logger.debug("No preset %s to recall", arguments[0])
+        elif command == 'go':
+            self.core.go()
+        elif command == 'back':
+            self.core.back()
+        elif command == 'release':
+            self.core.release()
+        elif command == 'effect' and path[1:] == ['stop']:
+            self.core.stop_effect(int(arguments[0]) if arguments else None)
+        elif command == 'effect' and len(arguments) >= 3 and arguments[0] in effects.WAVEFORMS:
+            groups = self.core.patch.groups(range(int(arguments[1]), int(arguments[2]) + 1))
+            options = dict(zip(('rate', 'size', 'spread'), arguments[3:6]))
+            if 'size' in options:
+                options['size'] = osc_level(options['size'])
+            if groups:
+                self.core.start_effect(arguments[0], groups, **options)
+        else:
+            logger.debug("Unknown OSC command /%s %s", '/'.join(path), arguments)
+
+    def sacn_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.sacn_port))
+        for universe in range(1, self.input.universe_count + 1):
+            group = socket.inet_aton('239.255.{}.{}'.format(universe >> 8, universe & 0xff))
+            try:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, group + socket.inet_aton('0.0.0.0'))
+            except OSError as error:
+                logger.warning("Could not join the sACN multicast group of universe %s: %s", universe, error)
+        return sock
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        endpoints = (('Art-Net', self.handle_artnet, lambda: {'local_addr': (self.host, self.artnet_port)}),
+                     ('sACN', self.handle_sacn, lambda: {'sock': self.sacn_socket()}),
+                     ('OSC', self.handle_osc, lambda: {'local_addr': (self.host, self.osc_port)}))
+        for name, handler, endpoint in endpoints:
+            try:
+                transport, _ = await loop.create_datagram_endpoint(lambda: _DatagramHandler(handler), **endpoint())
+            except OSError as error:
+                logger.warning("%s input disabled: %s", name, error)
+                continue
+            self.transports.append(transport)
+            logger.info("%s listening on %s", name, transport.get_extra_info('sockname'))
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        for transport in self.transports:
+            transport.close()
+        self.transports = []
+
+    def run(self) -> None:
+        asyncio.run(self.serve_forever())
+
+    def start_thread(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name="NetworkServer", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,368 @@
+import logging
+import threading
+import time
+
+import pyUDMX
+
+logger = logging.getLogger(__name__)
+
+
+class USBInterface:
+    universe_size = 512
+    merge_gap = 6
+    min_reconnect_backoff = 0.05
+    max_reconnect_backoff = 5.0
+
+    def __init__(self, bus=None, address=None, claimed=None, transport=None, hotplug=False):
+        """
+        :param hotplug: leave opening the device to attach(), called when device discovery finds it
+        """
+        self.transport = transport
+        self.device = pyUDMX.uDMXDevice(transport)
+        self.hotplug = hotplug
+        self.connected = False if hotplug else self.device.open(bus=bus, address=address)
+        self.bus, self.address = bus, address
+        self.claimed = set() if claimed is None else claimed
+        if self.connected:
+            self.bus, self.address = self.device.Device.bus, self.device.Device.address
+            self.claimed.add((self.bus, self.address))
+        self.reconnect_backoff = self.min_reconnect_backoff
+        self.next_reconnect_time = 0
+        self.reconnects = 0
+        self.last_reconnect_latency = None
+        # Set when a transfer fails, until the interface is back or discovery takes over
+        self.lost = False
+        self.found_at = None
+        self.time_to_first_frame = None
+        self.universe = bytearray(self.universe_size)
+        self.transmitted = None
+        self.dirty_start = self.universe_size
+        self.dirty_end = 0
+        self.counters = dict.fromkeys(('transfers', 'bytes_sent', 'transfers_saved', 'bytes_saved', 'errors'), 0)
+        self.last_counters = dict(self.counters)
+        self.last_counter_time = time.monotonic()
+
+    def set_channel(self, channel, value):
+        self.write_frame(channel, [value])
+
+    def write_frame(self, start_channel, values):
+        start = start_channel - 1
+        end = start + len(values)
+        self.universe[start:end] = bytes(values)
+        self.dirty_start = min(self.dirty_start, start)
+        self.dirty_end = max(self.dirty_end, end)
+
+    def changed_runs(self, start, end):
+        universe = self.universe
+        transmitted = self.transmitted
+        if universe[start:end] == transmitted[start:end]:
+            return [], 0
+        runs = []
+        changed_channels = 0
+        run_start = run_end = None
+        for i in range(start, end):
+            if universe[i] != transmitted[i]:
+                changed_channels += 1
+                if run_start is not None and i - run_end <= self.merge_gap:
+                    run_end = i + 1
+                else:
+                    if run_start is not None:
+                        runs.append((run_start, run_end))
+                    run_start, run_end = i, i + 1
+        runs.append((run_start, run_end))
+        return runs, changed_channels
+
+    def flush(self):
+        if self.connected and self.device.transfer_failed:
+            # A transfer failed on the device's worker after the last flush, perhaps with nothing new to send.
+            try:
+                self.device.check_transfer_error()
+            except (pyUDMX.TransferError, ValueError) as error:
+                self.connection_lost(error)
+        if self.dirty_start >= self.dirty_end:
+            return 0
+        if not self.connected and not ((self.lost or not self.hotplug) and self.reconnect()):
+            # Only the latest state is kept until an interface is attached.
+            return 0
+        start, end = self.dirty_start, self.dirty_end
+        self.dirty_start = self.universe_size
+        self.dirty_end = 0
+        if self.transmitted is None:
+            self.transmitted = bytearray(self.universe_size)
+            runs = [(start, end)]
+            changed_channels = end - start
+        else:
+            runs, changed_channels = self.changed_runs(start, end)
+        sent = 0
+        try:
+            for run_start, run_end in runs:
+                self.device.submit_frame(run_start + 1, self.universe[run_start:run_end])
+                self.transmitted[run_start:run_end] = self.universe[run_start:run_end]
+                sent += run_end - run_start
+        except (pyUDMX.TransferError, ValueError) as error:
+            self.connection_lost(error)
+            return sent
+        if self.found_at is not None:
+            self.time_to_first_frame = time.perf_counter() - self.found_at
+            self.found_at = None
+            logger.info("uDMX on bus %s address %s sent its first frame %.1f ms after it was found",
+                        self.bus, self.address, self.time_to_first_frame * 1000)
+        self.counters['transfers'] += len(runs)
+        self.counters['bytes_sent'] += sent
+        self.counters['transfers_saved'] += changed_channels - len(runs)
+        self.counters['bytes_saved'] += (end - start) - sent
+        return sent
+
+    def counter_rates(self):
+        now = time.monotonic()
+        elapsed = max(now - self.last_counter_time, 1e-9)
+        rates = {name + '_per_second': (value - self.last_counters[name]) / elapsed
+                 for name, value in self.counters.items()}
+        self.last_counters = dict(self.counters)
+        self.last_counter_time = now
+        return rates
+
+    def stats(self):
+        stats = self.counter_rates()
+        stats['connected'] = self.connected
+        stats['reconnects'] = self.reconnects
+        stats['last_reconnect_latency'] = self.last_reconnect_latency
+        stats['time_to_first_frame'] = self.time_to_first_frame
+        stats['queue_depth'] = self.device.queue_depth
+        stats['frames_dropped'] = self.device.frames_dropped
+        stats['latency_histogram'] = dict(zip(self.device.latency_buckets, self.device.latency_histogram))
+        return stats
+
+    def send_signal(self, channel, value):
+        self.set_channel(channel, value)
+        self.flush()
+
+    def set_devices(self, **kwargs):
+        for channel, value in kwargs.items():
+            self.set_channel(int(channel), value)
+        self.flush()
+
+    def connection_lost(self, error):
+        logger.warning("uDMX transfer failed, reconnecting: %s", error)
+        self.counters['errors'] += 1
+        self.connected = False
+        self.lost = True
+        self.next_reconnect_time = 0
+        # The device may have been power cycled, so the whole universe is sent again once it is back.
+        self.transmitted = None
+        self.write_frame(1, self.universe)
+
+    def attach(self, bus, address, found_at):
+        """
+        Open the interface discovery found at bus and address and send it the whole universe.
+        :param found_at: time.perf_counter() when it was found, to time the first frame from
+        """
+        # From here on discovery decides where the interface goes, so reconnect() stops retrying.
+        lost, self.lost = self.lost, False
+        started = time.perf_counter()
+        self.device.close()
+        self.claimed.discard((self.bus, self.address))
+        if not self.device.open(bus=bus, address=address):
+            return False
+        self.bus, self.address = bus, address
+        self.claimed.add((bus, address))
+        self.connected = True
+        self.reconnect_backoff = self.min_reconnect_backoff
+        if lost:
+            self.reconnects += 1
+            self.last_reconnect_latency = time.perf_counter() - started
+        self.found_at = found_at
+        self.transmitted = None
+        self.write_frame(1, self.universe)
+        return True
+
+    def detach(self):
+        logger.warning("uDMX on bus %s address %s is gone", self.bus, self.address)
+        self.device.close()
+        self.claimed.discard((self.bus, self.address))
+        self.connected = False
+        self.lost = False
+        self.transmitted = None
+        self.write_frame(1, self.universe)
+
+    def reconnect(self):
+        """
+        Reopen the interface after a failed transfer, backing off while it keeps failing. With hotplug
+        only the same bus and address are tried; any other interface is handed out by discovery.
+        """
+        now = time.monotonic()
+        if now < self.next_reconnect_time:
+            return False
+        started = time.perf_counter()
+        self.device.close()
+        self.claimed.discard((self.bus, self.address))
+        found = self.device.open(bus=self.bus, address=self.address)
+        if not found and not self.hotplug:
+            # A replugged interface gets a new address, so fall back to any uDMX no other universe is using.
+            for bus, address in pyUDMX.uDMXDevice.find_all(transport=self.transport):
+                if (bus, address) not in self.claimed and self.device.open(bus=bus, address=address):
+                    found = True
+                    break
+        latency = time.perf_counter() - started
+        if not found:
+            self.next_reconnect_time = now + self.reconnect_backoff
+            logger.warning("uDMX reconnect failed after %.1f ms, retrying in %.2f s",
+                           latency * 1000, self.reconnect_backoff)
+            self.reconnect_backoff = min(self.reconnect_backoff * 2, self.max_reconnect_backoff)
+            return False
+        self.bus, self.address = self.device.Device.bus, self.device.Device.address
+        self.claimed.add((self.bus, self.address))
+        self.connected = True
+        self.lost = False
+        self.reconnect_backoff = self.min_reconnect_backoff
+        self.reconnects += 1
+        self.last_reconnect_latency = latency
+        logger.info("uDMX reconnected on bus %s address %s in %.1f ms", self.bus, self.address, latency * 1000)
+        return True
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.device.close()
+
+
+class UniverseManager:
+    universe_size = USBInterface.universe_size
+    hotplug_interval = 1.0
+
+    def __init__(self, universe_count=None, device_map=None, transport=None, discover=False):
+        """
+        :param discover: return without touching the bus and find the interfaces from a background
+            thread, attaching and detaching them as they are plugged in and out; there is one
+            universe per entry of device_map, or universe_count, or else just one
+        """
+        self.transport = transport
+        self.started = time.perf_counter()
+        self.recorder = None
+        self.on_hotplug = None
+        self.claimed = claimed = set()
+        if discover:
+            locations = [tuple(location) for location in device_map or ()]
+            self.universe_count = max(universe_count or len(locations), 1)
+            locations += [(None, None)] * (self.universe_count - len(locations))
+            self.interfaces = [USBInterface(bus, address, claimed, transport, hotplug=True)
+                               for bus, address in locations[:self.universe_count]]
+            logger.info("Looking for uDMX interfaces for %s universes", self.universe_count)
+        else:
+            locations = [tuple(location) for location in
+                         device_map or pyUDMX.uDMXDevice.find_all(transport=transport)]
+            self.universe_count = max(universe_count or len(locations), 1)
+            self.interfaces = [USBInterface(bus, address, claimed, transport)
+                               for bus, address in locations[:self.universe_count]]
+            if not self.interfaces:
+                self.interfaces.append(USBInterface(claimed=claimed, transport=transport))
+            for universe in range(len(self.interfaces), self.universe_count):
+                logger.warning("No uDMX interface for universe %s, its output is discarded", universe + 1)
+            logger.info("Universes mapped to uDMX interfaces: %s",
+                        ["{}:{}".format(interface.bus, interface.address) for interface in self.interfaces])
+        # Written by the discovery thread: every interface on the bus, and when that was noticed.
+        self.present = frozenset()
+        self.scanned_at = None
+        self._present_version = self._applied_version = 0
+        for interface in self.interfaces:
+            interface.device.on_transfer_error = self.transfer_failed
+        self._discovery_stopped = threading.Event()
+        self._discovery = None
+        if discover:
+            self._discovery = threading.Thread(target=self.discover, name="DeviceDiscovery", daemon=True)
+            self._discovery.start()
+
+    def discover(self):
+        interval = 0
+        last_error = None
+        while not self._discovery_stopped.wait(interval):
+            interval = self.hotplug_interval
+            try:
+                locations = pyUDMX.uDMXDevice.find_all(transport=self.transport)
+            except ImportError as error:
+                logger.error("Device discovery stopped: %s", error)
+                return
+            except (pyUDMX.TransferError, ValueError) as error:
+                # pyusb raises NoBackendError, a ValueError, while libusb is missing; it may be installed later.
+                if str(error) != last_error:
+                    logger.warning("Device discovery failed, retrying every %s s: %s", interval, error)
+                    last_error = str(error)
+                continue
+            last_error = None
+            present = frozenset(locations)
+            in_use = {(interface.bus, interface.address) for interface in self.interfaces if interface.connected}
+            # Also retry when an interface is waiting and a device it could take is on the bus, such as one
+            # that failed a transfer; with fewer devices than universes the rest just keep waiting.
+            attachable = len(in_use) < len(self.interfaces) and bool(present - in_use)
+            if present != self.present or attachable:
+                self.present, self.scanned_at = present, time.perf_counter()
+                self._present_version += 1
+                if len(present) > self.universe_count:
+                    logger.info("%s uDMX interfaces found for %s universes; start with --universes to use them all",
+                                len(present), self.universe_count)
+                if self.on_hotplug is not None:
+                    self.on_hotplug()
+
+    def transfer_failed(self, error):
+        """
+        Called from a device's transfer worker; wakes the output so the next flush notices the failure.
+        """
+        if self.on_hotplug is not None:
+            self.on_hotplug()
+
+    def apply_hotplug(self):
+        """
+        Attach and detach interfaces to match the last discovery; runs on the thread that flushes,
+        so only that thread ever touches the devices.
+        """
+        self._applied_version = self._present_version
+        present, scanned_at = self.present, self.scanned_at
+        for interface in self.interfaces:
+            if interface.connected and (interface.bus, interface.address) not in present:
+                interface.detach()
+        waiting = [interface for interface in self.interfaces if not interface.connected]
+        in_use = {(interface.bus, interface.address) for interface in self.interfaces if interface.connected}
+        # Interfaces take back the device they had, or were mapped to, before any other is handed out.
+        for interface in waiting:
+            location = (interface.bus, interface.address)
+            if location in present and location not in in_use and interface.attach(*location, scanned_at):
+                in_use.add(location)
+        for interface in waiting:
+            for location in sorted(set(present) - in_use):
+                if interface.connected:
+                    break
+                if interface.attach(*location, scanned_at):
+                    in_use.add(location)
+            if interface.connected:
+                logger.info("Universe %s attached to uDMX on bus %s address %s, %.2f s after startup",
+                            self.interfaces.index(interface) + 1, interface.bus, interface.address,
+                            time.perf_counter() - self.started)
+
+    def set_profiler(self, profiler):
+        for interface in self.interfaces:
+            interface.device.profiler = profiler
+
+    def write_frame(self, universe, start_channel, values):
+        if self.recorder is not None:
+            self.recorder.record(universe, start_channel, values)
+        if universe < len(self.interfaces):
+            self.interfaces[universe].write_frame(start_channel, values)
+
+    def flush(self):
+        if self._present_version != self._applied_version:
+            self.apply_hotplug()
+        if self.recorder is not None:
+            self.recorder.end_frame()
+        # Each device has its own transfer worker, so this only queues the frames and
+        # the devices send them in parallel.
+        return sum(interface.flush() for interface in self.interfaces)
+
+    def stats(self):
+        universes = [interface.stats() for interface in self.interfaces]
+        stats = {name: sum(universe[name] for universe in universes) for name in universes[0]
+                 if name.endswith('_per_second') or name in ('reconnects', 'queue_depth', 'frames_dropped')}
+        stats['universes'] = universes
+        return stats
+
+    def close(self):
+        self._discovery_stopped.set()
+        for interface in self.interfaces:
+            interface.device.close()
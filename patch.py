@@ -0,0 +1,279 @@
+import functools
+import operator
+
+import fades
+
+IDENTITY = bytes(range(256))
+INVERT = bytes(range(255, -1, -1))
+ZERO = bytes(256)
+
+
+@functools.lru_cache()
+def curve_table(curve: str) -> bytes:
+    """
+    :param curve: one of fades.CURVES
+    :return: a 256 byte table mapping a level to its output on that curve
+    """
+    function = fades.CURVES[curve]
+    return bytes(round(function(level / 255) * 255) for level in range(256))
+
+
+class Attribute:
+    def __init__(self, name: str, htp: bool = False, invert: bool = False, curve: str = 'linear', fine: bool = False):
+        """
+        :param name: e.g. 'intensity', 'red' or 'pan'
+        :param htp: intensity-like channels merge highest takes precedence and follow the masters,
+            all others merge latest takes precedence and ignore them
+        :param invert: output 255 minus the level
+        :param curve: output curve, one of fades.CURVES or the name of a custom curve table
+        :param fine: the low byte of a 16 bit attribute whose coarse byte is the channel before it;
+            fine channels are never curved, and inverting both bytes inverts the 16 bit value
+        """
+        self.name = name
+        self.htp = htp
+        self.invert = invert
+        self.curve = curve
+        self.fine = fine
+
+    @classmethod
+    def from_dict(cls, attribute_dict: dict):
+        return cls(**attribute_dict)
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'htp': self.htp, 'invert': self.invert, 'curve': self.curve, 'fine': self.fine}
+
+    def table(self, curves: dict = None) -> bytes:
+        """
+        :param curves: custom curves, {name: 256 byte table}
+        :return: the table mapping a level of this attribute to its output
+        """
+        if self.fine:
+            table = IDENTITY
+        elif curves and self.curve in curves:
+            table = curves[self.curve]
+        else:
+            table = curve_table(self.curve)
+        return table.translate(INVERT) if self.invert else table
+
+
+FIXTURES = {
+    'dimmer': [Attribute('intensity', htp=True)],
+    'rgb par': [Attribute('red', htp=True), Attribute('green', htp=True), Attribute('blue', htp=True)],
+    'rgb par with dimmer': [Attribute('intensity', htp=True), Attribute('red'), Attribute('green'),
+                            Attribute('blue'), Attribute('strobe')],
+    'moving head': [Attribute('pan'), Attribute('pan fine', fine=True), Attribute('tilt'),
+                    Attribute('tilt fine', fine=True), Attribute('speed'), Attribute('intensity', htp=True),
+                    Attribute('red'), Attribute('green'), Attribute('blue')],
+}
+
+
+class Fixture:
+    def __init__(self, fixture_type: str, name: str, universe: int, address: int, invert: list = (),
+                 curve: str = None, profiles: dict = None):
+        """
+        :param fixture_type: a key of FIXTURES or of profiles
+        :param universe: logical universe index, starting at 0
+        :param address: DMX address of the first channel, 1-512
+        :param invert: names of attributes to invert, e.g. pan and tilt of an upside down mover
+        :param curve: output curve for the intensity attributes, one of fades.CURVES
+        :param profiles: custom fixture types, {type: [Attribute]}, taking precedence over FIXTURES
+        """
+        self.fixture_type = fixture_type
+        self.name = name
+        self.universe = universe
+        self.address = address
+        self.invert = list(invert)
+        self.curve = curve
+        profile = (profiles or {}).get(fixture_type) or FIXTURES.get(fixture_type)
+        if profile is None:
+            raise ValueError("Unknown fixture type {!r}".format(fixture_type))
+        self.attributes = [Attribute(attribute.name, attribute.htp, attribute.invert != (attribute.name in invert),
+                                     curve if curve and attribute.htp else attribute.curve, attribute.fine)
+                           for attribute in profile]
+
+    @classmethod
+    def from_dict(cls, fixture_dict: dict, profiles: dict = None):
+        return cls(profiles=profiles, **fixture_dict)
+
+    def to_dict(self) -> dict:
+        return {'fixture_type': self.fixture_type, 'name': self.name, 'universe': self.universe,
+                'address': self.address, 'invert': self.invert, 'curve': self.curve}
+
+
+class Patch:
+    """
+    Assigns every desk channel to one attribute of a patched fixture. The patch is compiled into
+    flat per-universe tables: the desk channel feeding each DMX slot and the output table of that
+    slot, so turning desk levels into a universe is one gather and one table lookup per slot.
+
+    The output table of an HTP channel folds its curve together with the grand master and its
+    sub-master level. The tables are rebuilt only when one of those changes, and channels that
+    share a curve and a level share one table.
+    """
+    def __init__(self, fixtures: list, universe_size: int = 512, curves: dict = None):
+        """
+        :param curves: custom curves, {name: 256 levels}
+        """
+        self.fixtures = fixtures
+        self.universe_size = universe_size
+        self.curves = {name: bytes(table) for name, table in (curves or {}).items()}
+        for name, table in self.curves.items():
+            if len(table) != 256:
+                raise ValueError("Curve {!r} has {} levels instead of 256".format(name, len(table)))
+        # Desk channel -> (fixture, attribute, universe, address), in patch order.
+        self.channels = []
+        used = {}
+        for fixture in fixtures:
+            for offset, attribute in enumerate(fixture.attributes):
+                slot = (fixture.universe, fixture.address + offset)
+                if not 1 <= slot[1] <= universe_size:
+                    raise ValueError("{} does not fit in universe {}".format(fixture.name, fixture.universe + 1))
+                if slot in used:
+                    raise ValueError("{} overlaps {} at {}/{}".format(fixture.name, used[slot].name,
+                                                                     slot[0] + 1, slot[1]))
+                used[slot] = fixture
+                self.channels.append((fixture, attribute, fixture.universe, fixture.address + offset))
+        count = len(self.channels)
+        self.fixture_channels = {}
+        for channel, (fixture, _, _, _) in enumerate(self.channels):
+            self.fixture_channels.setdefault(id(fixture), []).append(channel)
+        # Unpatched slots gather the zero after the last desk level.
+        self.index = {}
+        for channel, (fixture, attribute, universe, address) in enumerate(self.channels):
+            self.index.setdefault(universe, [count] * universe_size)[address - 1] = channel
+        self.htp = bytes(255 if attribute.htp else 0 for _, attribute, _, _ in self.channels)
+        self.base_tables = [attribute.table(self.curves) for _, attribute, _, _ in self.channels]
+        self.scales = b'\xff' * count
+        self._version = 0
+        self._compiled = None
+
+    @classmethod
+    def dimmers(cls, channel_count: int, curve: str = None, curves: dict = None, universe_size: int = 512):
+        """
+        The unpatched desk: desk channel n drives dimmer n of universe 1.
+        """
+        return cls([Fixture('dimmer', "Dimmer {}".format(channel), 0, channel, curve=curve)
+                    for channel in range(1, channel_count + 1)],
+                   universe_size, curves)
+
+    @classmethod
+    def from_dicts(cls, fixture_dicts: list, profiles: dict = None, curves: dict = None, universe_size: int = 512):
+        """
+        :param profiles: custom fixture types as stored, {type: [attribute dict]}
+        """
+        profiles = {fixture_type: [Attribute.from_dict(attribute) for attribute in attributes]
+                    for fixture_type, attributes in (profiles or {}).items()}
+        return cls([Fixture.from_dict(fixture_dict, profiles) for fixture_dict in fixture_dicts], universe_size,
+                   curves)
+
+    def to_dicts(self) -> list:
+        return [fixture.to_dict() for fixture in self.fixtures]
+
+    def label(self, channel: int) -> str:
+        """
+        :param channel: desk channel, 0-based
+        """
+        fixture, attribute, _, _ = self.channels[channel]
+        if len(fixture.attributes) == 1:
+            return fixture.name
+        return "{} {}".format(fixture.name, attribute.name)
+
+    def groups(self, channels) -> list:
+        """
+        :param channels: desk channels, 1-based
+        :return: the channels grouped by fixture, in patch order
+        """
+        groups = {}
+        for channel in channels:
+            if 1 <= channel <= len(self.channels):
+                groups.setdefault(id(self.channels[channel - 1][0]), []).append(channel)
+        return list(groups.values())
+
+    def ltp_mask(self, frames: list) -> int:
+        """
+        :param frames: desk levels, e.g. the presets a playback can output
+        :return: big-endian mask of the LTP channels of every fixture with a level above 0 in any frame
+        """
+        mask = bytearray(len(self.channels))
+        for channels in self.fixture_channels.values():
+            if any(frame[channel] for frame in frames for channel in channels if channel < len(frame)):
+                for channel in channels:
+                    if not self.htp[channel]:
+                        mask[channel] = 255
+        return int.from_bytes(mask, 'big')
+
+    def set_curve(self, channel: int, curve: str) -> None:
+        """
+        :param channel: desk channel, 0-based
+        :param curve: one of fades.CURVES or a custom curve name
+        """
+        attribute = self.channels[channel][1]
+        if curve not in self.curves and curve not in fades.CURVES:
+            raise ValueError("Unknown curve {!r}".format(curve))
+        attribute.curve = curve
+        self.base_tables[channel] = attribute.table(self.curves)
+        self._version += 1
+
+    def set_scales(self, scales: bytes) -> None:
+        """
+        :param scales: the sub-master level of every desk channel, 0-255
+        """
+        self.scales = bytes(scales)
+        self._version += 1
+
+    def compile(self, master: int) -> tuple:
+        """
+        :return: (key, output table of every desk channel, {universe: (shared table or None, slot tables)})
+        """
+        key = (master, self._version)
+        compiled = self._compiled
+        if compiled is not None and compiled[0] == key:
+            return compiled
+        composites = {}
+        channel_tables = []
+        for channel, table in enumerate(self.base_tables):
+            level = master * self.scales[channel] // 255 if self.htp[channel] else 255
+            composite = composites.get((table, level))
+            if composite is None:
+                composite = composites[table, level] = fades.scale(IDENTITY, level).translate(table)
+            channel_tables.append(composite)
+        universes = {}
+        for universe, index in self.index.items():
+            tables = [channel_tables[channel] if channel < len(channel_tables) else ZERO for channel in index]
+            patched = {id(table): table for table in tables if table is not ZERO}
+            shared = None
+            if len(patched) == 1:
+                shared = next(iter(patched.values()))
+                if shared[0]:
+                    shared = None
+            universes[universe] = (shared, tables)
+        compiled = self._compiled = (key, channel_tables, universes)
+        return compiled
+
+    def render(self, levels: bytes, master: int = 255) -> dict:
+        """
+        :param levels: a level for every desk channel
+        :param master: scales the intensity (HTP) channels
+        :return: {universe: frame} for every universe with patched fixtures
+        """
+        _, _, universes = self.compile(master)
+        count = len(self.channels)
+        source = bytes(levels[:count]).ljust(count + 1, b'\x00')
+        frames = {}
+        for universe, index in self.index.items():
+            frame = bytes(map(source.__getitem__, index))
+            shared, tables = universes[universe]
+            if shared is not None:
+                frames[universe] = frame.translate(shared)
+            else:
+                frames[universe] = bytes(map(operator.getitem, tables, frame))
+        return frames
+
+    def render_channels(self, levels: bytes, master: int, start: int, end: int) -> list:
+        """
+        Render only desk channels start to end - 1.
+        :return: list of (universe, address, output value)
+        """
+        _, channel_tables, _ = self.compile(master)
+        return [(self.channels[channel][2], self.channels[channel][3], channel_tables[channel][levels[channel]])
+                for channel in range(start, min(end, len(self.channels)))]
@@ -0,0 +1,87 @@
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+class PresetIndex:
+    """
+    Name search over the preset list. Every word of a preset's name, and its number, is kept
+    in one sorted token list, so a query word is a bisect to the range of tokens it prefixes.
+    """
+    def __init__(self, names: list = (), present: list = None):
+        """
+        :param names: preset names by position, '' for unnamed presets
+        :param present: positions that hold a preset, default every position
+        """
+        self.positions = list(range(len(names))) if present is None else sorted(present)
+        self.tokens = sorted((token, position) for position in self.positions
+                             for token in self.tokenise(str(position) + ' ' + (names[position] or '')))
+
+    @staticmethod
+    def tokenise(text: str) -> set:
+        return set(text.lower().split())
+
+    def prefixed(self, word: str) -> set:
+        start = bisect_left(self.tokens, (word, -1))
+        positions = set()
+        for token, position in self.tokens[start:]:
+            if not token.startswith(word):
+                break
+            positions.add(position)
+        return positions
+
+    def search(self, query: str) -> list:
+        """
+        :return: positions of the presets with a word starting with every word of the query
+        """
+        words = self.tokenise(query)
+        if not words:
+            return self.positions
+        matches = None
+        for word in words:
+            positions = self.prefixed(word)
+            matches = positions if matches is None else matches & positions
+        return sorted(matches)
+
+
+def preview_columns(levels: list, width: int) -> list:
+    """
+    Squash a preset into width columns, each the highest level of the channels it covers.
+    """
+    if not levels:
+        return [0] * width
+    columns = []
+    for column in range(width):
+        start = column * len(levels) // width
+        end = max((column + 1) * len(levels) // width, start + 1)
+        columns.append(max(int(level) for level in levels[start:end]))
+    return columns
+
+
+class PreviewCache:
+    """
+    Least recently used cache of rendered previews, so scrolling back over presets does not
+    render them again.
+    """
+    def __init__(self, render, capacity: int = 1000):
+        """
+        :param render: called with a key to render a preview that is not cached
+        """
+        self.render = render
+        self.capacity = capacity
+        self.previews = OrderedDict()
+
+    def get(self, key):
+        preview = self.previews.get(key)
+        if preview is None:
+            preview = self.previews[key] = self.render(key)
+            if len(self.previews) > self.capacity:
+                self.previews.popitem(last=False)
+        else:
+            self.previews.move_to_end(key)
+        return preview
+
+    def discard(self, key) -> None:
+        self.previews.pop(key, None)
+
+    def clear(self) -> None:
+        self.previews.clear()
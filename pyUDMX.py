@@ -24,16 +24,60 @@
 # dev.close()
 #
 
-import usb  # the pyusb module is required to be in the current environment
+import threading
+import time
 from typing import Union, List  # support type hinting
 
+try:
+    import usb  # the pyusb module is required to talk to real interfaces
+    TransferError = usb.core.USBError
+except ImportError:
+    usb = None
+    TransferError = IOError
 
-class uDMXDevice:
+
+class USBTransport:
+    """
+    Finds and releases uDMX interfaces through pyusb. uDMXDevice talks to the bus only
+    through a transport, so a simulated one (see loopback.py) can stand in for the hardware.
+    """
     def __init__(self):
+        if usb is None:
+            raise ImportError("The pyusb module is required to use USB uDMX interfaces")
+
+    def find(self, find_all: bool = False, **kwargs):
+        return usb.core.find(find_all=find_all, **kwargs)
+
+    def dispose(self, device):
+        usb.util.dispose_resources(device)
+
+
+class uDMXDevice:
+    # Upper bounds, in milliseconds, of the transfer latency histogram buckets
+    latency_buckets = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, float("inf"))
+
+    def __init__(self, transport=None):
+        """
+        :param transport: object with find() and dispose() like USBTransport, defaults to a USBTransport
+        """
+        self._transport = transport or USBTransport()
         self._dev = None
+        self._image = bytearray(512)
+        self._pending_spans = []
+        self._pending_frames = 0
+        self._transfer_error = None
+        self._condition = threading.Condition()
+        self._worker = None
+        self.frames_submitted = 0
+        self.frames_dropped = 0
+        self.latency_histogram = [0] * len(self.latency_buckets)
+        # Optional instrumentation.Profiler that also receives each transfer's duration
+        self.profiler = None
+        # Optional callable, called from the worker with the error of a failed asynchronous transfer
+        self.on_transfer_error = None
 
     @property
-    def Device(self) -> usb.core.Device:
+    def Device(self) -> "usb.core.Device":
         """
         Returns the wrapped usb.core.Device instance.
         Refer to the usb.core.Device class for details of the Device class.
@@ -63,18 +107,31 @@ class uDMXDevice:
         if address:
             kwargs["address"] = address
         # Find the uDMX interface
-        self._dev = usb.core.find(**kwargs)
+        self._dev = self._transport.find(**kwargs)
         return self._dev is not None
 
+    @staticmethod
+    def find_all(vendor_id: int = 0x16c0, product_id: int = 0x5dc, transport=None) -> List[tuple]:
+        """
+        Find every connected device that matches the search criteria.
+        :param vendor_id:
+        :param product_id:
+        :param transport: defaults to a USBTransport
+        :return: list of (bus, address) tuples that can be passed to open().
+        """
+        devices = (transport or USBTransport()).find(find_all=True, idVendor=vendor_id, idProduct=product_id)
+        return [(device.bus, device.address) for device in devices]
+
     def close(self):
         """
         Close and release the current usb device.
         :return: None
         """
+        self._stop_worker()
         # This may not be absolutely necessary, but it is safe.
         # It's the closest thing to a close() method.
         if self._dev is not None:
-            usb.util.dispose_resources(self._dev)
+            self._transport.dispose(self._dev)
             self._dev = None
 
     def _send_control_message(self, cmd: int, value_or_length: int = 1, channel: int = 1,
@@ -96,7 +153,8 @@ class uDMXDevice:
         # All data transfers use this request type. This is more for
         # the PyUSB package than for the uDMX as the uDMX does not
         # use it..
-        bmRequestType = usb.util.CTRL_TYPE_VENDOR | usb.util.CTRL_RECIPIENT_DEVICE | usb.util.CTRL_OUT
+        # CTRL_TYPE_VENDOR | CTRL_RECIPIENT_DEVICE | CTRL_OUT
+        bmRequestType = 0x40 | 0x00 | 0x00
 
         """
         usb request for SetSingleChannel:
@@ -149,6 +207,129 @@ class uDMXDevice:
                                        channel=channel, data_or_length=ba)
         return n
 
+    def submit_frame(self, channel: int, values: Union[List[int], bytearray]) -> None:
+        """
+        Queue consecutive values for sending by the background worker and return immediately.
+        Frames are coalesced: values submitted before the worker gets to them are
+        overwritten by later submissions, so only the latest state is ever sent.
+        An error raised by an earlier asynchronous transfer is re-raised here.
+        :param channel: The starting DMX channel number, 1-512
+        :param values: sequence of values 0-255
+        :return: None
+        """
+        start = channel - 1
+        end = start + len(values)
+        with self._condition:
+            self._raise_transfer_error()
+            if self._dev is None:
+                raise ValueError("No usb device opened")
+            self._image[start:end] = bytes(values)
+            if self._add_pending_span(start, end):
+                self.frames_dropped += 1
+            self.frames_submitted += 1
+            self._pending_frames += 1
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._transfer_worker, name="uDMXTransfer", daemon=True)
+                self._worker.start()
+            self._condition.notify()
+
+    @property
+    def transfer_failed(self) -> bool:
+        """
+        Returns True if an asynchronous transfer failed and its error has not been raised yet.
+        """
+        return self._transfer_error is not None
+
+    def check_transfer_error(self) -> None:
+        """
+        Re-raise the error of a failed asynchronous transfer, if there is one, and let the
+        worker send the values it could not send.
+        """
+        with self._condition:
+            self._raise_transfer_error()
+
+    def _raise_transfer_error(self):
+        if self._transfer_error is not None:
+            error, self._transfer_error = self._transfer_error, None
+            self._condition.notify()
+            raise error
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Returns the number of submitted frames that are waiting to be sent.
+        """
+        return self._pending_frames
+
+    def _add_pending_span(self, start: int, end: int) -> bool:
+        """
+        Merge a span into the pending spans.
+        :return: True if it overwrote values that had not been sent yet.
+        """
+        spans = []
+        superseded = False
+        for span_start, span_end in self._pending_spans:
+            if span_end < start or span_start > end:
+                spans.append((span_start, span_end))
+            else:
+                superseded = superseded or (span_end > start and span_start < end)
+                start, end = min(start, span_start), max(end, span_end)
+        spans.append((start, end))
+        self._pending_spans = spans
+        return superseded
+
+    def _transfer_worker(self):
+        worker = threading.current_thread()
+        while True:
+            with self._condition:
+                # After a failure nothing is sent until the error has been raised to the caller.
+                while (not self._pending_spans or self._transfer_error is not None) and self._worker is worker:
+                    self._condition.wait()
+                if self._worker is not worker:
+                    return
+                spans, self._pending_spans = self._pending_spans, []
+                self._pending_frames = 0
+                data = [(start, self._image[start:end]) for start, end in spans]
+            sent = 0
+            try:
+                for start, values in data:
+                    started = time.perf_counter()
+                    self.send_multi_value(start + 1, values)
+                    duration = time.perf_counter() - started
+                    sent += 1
+                    self._record_latency(duration * 1000)
+                    if self.profiler is not None:
+                        self.profiler.record('transfer', duration)
+            except (TransferError, ValueError) as error:
+                with self._condition:
+                    if self._worker is not worker:
+                        return
+                    # Spans submitted meanwhile hold the newer values, so the merge keeps them.
+                    for start, values in data[sent:]:
+                        self._add_pending_span(start, start + len(values))
+                    self._pending_frames += 1
+                    self._transfer_error = error
+                callback = self.on_transfer_error
+                if callback is not None:
+                    callback(error)
+
+    def _record_latency(self, milliseconds: float):
+        for i, bucket in enumerate(self.latency_buckets):
+            if milliseconds <= bucket:
+                self.latency_histogram[i] += 1
+                return
+
+    def _stop_worker(self):
+        with self._condition:
+            worker = self._worker
+            self._worker = None
+            self._pending_spans = []
+            self._pending_frames = 0
+            self._transfer_error = None
+            self._condition.notify()
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(1)
+
     def __enter__(self):
         self.open()
         return self
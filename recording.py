@@ -0,0 +1,218 @@
+"""
+Show recording: the frames written to the universes, stored as a time-stamped stream of
+universe deltas that can be replayed through the same UniverseManager path.
+
+File layout, little-endian:
+    header   magic (8 bytes), flags (1 byte), wall clock start time (double)
+    blocks   stored length (uint32), raw length (uint32), then the block, zlib compressed if
+             the header flags say so
+    records  inside a block: seconds since the start (double), universe, offset, length
+             (uint16 each), then length bytes of channel values starting at offset
+
+Records with the same time stamp belong to one frame. The file is only ever appended to, and
+a block is only written whole, so a recording cut short by a crash is readable up to its
+last complete block.
+"""
+import mmap
+import struct
+import threading
+import time
+import zlib
+
+from collections import deque
+
+MAGIC = b'UDMXSHOW'
+FLAG_ZLIB = 1
+HEADER = struct.Struct('<8sBd')
+BLOCK = struct.Struct('<II')
+RECORD = struct.Struct('<dHHH')
+
+
+def changed_runs(old: bytes, new: bytes, gap: int) -> list:
+    """
+    :return: (start, end) of the runs where new differs from old, merging runs closer than gap
+    """
+    runs = []
+    for i, (before, after) in enumerate(zip(old, new)):
+        if before != after:
+            if runs and i - runs[-1][1] <= gap:
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1])
+    return runs
+
+
+class Recorder:
+    """
+    Records every frame written to a UniverseManager. record() only queues a copy of the
+    frame; the deltas are worked out, compressed and written by a background thread. All the
+    writes up to end_frame(), which the manager calls when it flushes, share one time stamp,
+    so an engine frame over several universes replays as one frame.
+
+    recorder = Recorder('show.udmx')
+    universe_manager.recorder = recorder
+    """
+    universe_size = 512
+    merge_gap = 8
+
+    def __init__(self, path: str, compress: bool = False, flush_interval: float = 0.5, block_size: int = 1 << 16):
+        """
+        :param compress: zlib compress every block
+        :param flush_interval: seconds between writes, the most a crash can lose
+        :param block_size: raw bytes after which a block is written without waiting for the interval
+        """
+        self.path = path
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.block_size = block_size
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, FLAG_ZLIB if compress else 0, time.time()))
+        self.started = time.perf_counter()
+        self.records = 0
+        self.bytes_written = HEADER.size
+        self._queue = deque()
+        self._frames = {}
+        self._block = bytearray()
+        self._frame_time = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="Recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, universe: int, start_channel: int, values) -> None:
+        """
+        Called from the output thread for every frame written to a universe.
+        """
+        if self._frame_time is None:
+            self._frame_time = time.perf_counter()
+        self._queue.append((self._frame_time, universe, start_channel - 1, bytes(values)))
+
+    def end_frame(self) -> None:
+        """
+        Called from the output thread once every universe of a frame has been recorded.
+        """
+        self._frame_time = None
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            self._drain()
+            self._write_block()
+        self._drain()
+        self._write_block()
+        self.file.close()
+
+    def _drain(self) -> None:
+        queue = self._queue
+        while queue:
+            now, universe, start, values = queue.popleft()
+            frame = self._frames.get(universe)
+            if frame is None:
+                frame = self._frames[universe] = bytearray(self.universe_size)
+                runs = [(0, len(values))]
+            else:
+                runs = changed_runs(frame[start:start + len(values)], values, self.merge_gap)
+            frame[start:start + len(values)] = values
+            elapsed = now - self.started
+            for run_start, run_end in runs:
+                self._block += RECORD.pack(elapsed, universe, start + run_start, run_end - run_start)
+                self._block += values[run_start:run_end]
+                self.records += 1
+            if len(self._block) >= self.block_size:
+                self._write_block()
+
+    def _write_block(self) -> None:
+        if not self._block:
+            return
+        raw = bytes(self._block)
+        stored = zlib.compress(raw) if self.compress else raw
+        self.file.write(BLOCK.pack(len(stored), len(raw)) + stored)
+        self.file.flush()
+        self.bytes_written += BLOCK.size + len(stored)
+        self._block = bytearray()
+
+    def close(self) -> None:
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._thread.join()
+
+
+class Player:
+    """
+    Replays a recording with its original frame timing. The file is memory mapped and read
+    one block at a time, so a long show is never loaded whole.
+    """
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError("{} is not a show recording".format(path))
+        magic, flags, self.wall_started = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a show recording".format(path))
+        self.compressed = bool(flags & FLAG_ZLIB)
+
+    def blocks(self):
+        offset = HEADER.size
+        size = len(self.map)
+        while offset + BLOCK.size <= size:
+            stored, raw = BLOCK.unpack_from(self.map, offset)
+            offset += BLOCK.size
+            if offset + stored > size:
+                break
+            if self.compressed:
+                yield zlib.decompress(self.map[offset:offset + stored])
+            else:
+                yield memoryview(self.map)[offset:offset + stored]
+            offset += stored
+
+    def frames(self):
+        """
+        :return: iterator of (seconds since the start, [(universe, offset, values)])
+        """
+        frame_time, writes = None, []
+        for block in self.blocks():
+            # The records are copied out and the view of the map released before anything is yielded,
+            # so close() works while this generator is suspended.
+            records = []
+            position = 0
+            while position + RECORD.size <= len(block):
+                elapsed, universe, start, length = RECORD.unpack_from(block, position)
+                position += RECORD.size
+                records.append((elapsed, universe, start, bytes(block[position:position + length])))
+                position += length
+            if isinstance(block, memoryview):
+                block.release()
+            for elapsed, universe, start, values in records:
+                if elapsed != frame_time and writes:
+                    yield frame_time, writes
+                    writes = []
+                frame_time = elapsed
+                writes.append((universe, start, values))
+        if writes:
+            yield frame_time, writes
+
+    def play(self, universes, speed: float = 1.0, stopped: threading.Event = None) -> int:
+        """
+        Write every recorded frame to a UniverseManager at the time it was recorded.
+        :param speed: playback speed, 2.0 plays twice as fast
+        :param stopped: set to stop playing early
+        :return: the number of frames played
+        """
+        stopped = stopped or threading.Event()
+        started = time.perf_counter()
+        first = None
+        played = 0
+        for frame_time, writes in self.frames():
+            if first is None:
+                first = frame_time
+            delay = started + (frame_time - first) / speed - time.perf_counter()
+            if delay > 0 and stopped.wait(delay):
+                break
+            for universe, start, values in writes:
+                universes.write_frame(universe, start + 1, values)
+            universes.flush()
+            played += 1
+        return played
+
+    def close(self) -> None:
+        self.map.close()
+        self.file.close()
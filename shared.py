@@ -0,0 +1,215 @@
+"""
+Multi-process output: the desk composes frames in its own process and writes them into a
+shared memory block; a separate output process reads the block and drives the uDMX
+interfaces, so the DMX timing does not share a GIL with Tk or the effect maths.
+
+Block layout, native byte order:
+    stats     sequence (uint64), then the output process's STATS (doubles)
+    universes for every universe a sequence (uint64), then 512 channel values
+
+Every slot is guarded by a sequence lock. A writer makes the sequence odd, writes the slot
+and makes it even again; a reader copies the slot and keeps the copy only if the sequence
+was even and unchanged across it, otherwise it tries again. Readers never block writers,
+and a reader that sees the sequence it read last time knows the universe has not changed.
+Writers of the universes, from any process, serialise on one lock.
+"""
+import logging
+import multiprocessing
+import signal
+import struct
+import sys
+import time
+
+from multiprocessing import shared_memory
+
+from engine import OutputEngine
+from loopback import LoopbackTransport
+from output import UniverseManager
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE = struct.Struct('Q')
+STATS = ('fps', 'jitter', 'frames_sent', 'late_frames')
+
+
+class SharedUniverses:
+    """
+    The universes of a desk in shared memory. It stands in for a UniverseManager in the
+    process that composes the frames, and is read by the OutputProcess.
+
+    universes = SharedUniverses(2)
+    other_process_universes = SharedUniverses(2, universes.name, universes.lock)
+    """
+    universe_size = 512
+    stats_interval = 0.25
+
+    def __init__(self, universe_count: int, name: str = None, lock=None):
+        """
+        :param name: the block to attach to; a new block is created if None
+        :param lock: the writers' lock of the block, shared by every process that attaches to it
+        """
+        self.universe_count = max(universe_count, 1)
+        self.recorder = None
+        self.owner = name is None
+        stats_size = SEQUENCE.size + 8 * len(STATS)
+        slot_size = SEQUENCE.size + self.universe_size
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=stats_size + self.universe_count * slot_size)
+        elif sys.version_info >= (3, 13):
+            self.memory = shared_memory.SharedMemory(name, track=False)
+        else:
+            # Child processes share the creator's resource tracker, so attaching registers nothing new.
+            self.memory = shared_memory.SharedMemory(name)
+        self.name = self.memory.name
+        self.lock = multiprocessing.Lock() if lock is None else lock
+        buffer = self.memory.buf
+        self._stats_sequence = buffer[:SEQUENCE.size].cast('Q')
+        self._stats = buffer[SEQUENCE.size:stats_size].cast('d')
+        self._sequences = []
+        self._frames = []
+        for universe in range(self.universe_count):
+            offset = stats_size + universe * slot_size
+            self._sequences.append(buffer[offset:offset + SEQUENCE.size].cast('Q'))
+            self._frames.append(buffer[offset + SEQUENCE.size:offset + slot_size])
+
+    def set_profiler(self, profiler) -> None:
+        pass
+
+    def write_frame(self, universe: int, start_channel: int, values) -> None:
+        if self.recorder is not None:
+            self.recorder.record(universe, start_channel, values)
+        if universe >= self.universe_count:
+            return
+        start = start_channel - 1
+        sequence = self._sequences[universe]
+        with self.lock:
+            sequence[0] += 1
+            self._frames[universe][start:start + len(values)] = bytes(values)
+            sequence[0] += 1
+
+    def flush(self) -> int:
+        """
+        Frames are visible to the output process as soon as they are written.
+        """
+        if self.recorder is not None:
+            self.recorder.end_frame()
+        return 0
+
+    def read(self, universe: int, since: int = None) -> tuple:
+        """
+        :param since: the sequence returned by the last read of this universe
+        :return: (sequence, a consistent copy of the universe), or (since, None) if it is unchanged
+        """
+        sequence = self._sequences[universe]
+        frame = self._frames[universe]
+        while True:
+            before = sequence[0]
+            if before == since:
+                return since, None
+            if before & 1:
+                # A writer is inside; let it finish.
+                time.sleep(0)
+                continue
+            values = bytes(frame)
+            if sequence[0] == before:
+                return before, values
+
+    def write_stats(self, engine: OutputEngine) -> None:
+        """
+        Publish the timing of the output process; only the output process calls this.
+        """
+        values = (engine.fps, engine.jitter, engine.frames_sent, engine.late_frames)
+        self._stats_sequence[0] += 1
+        for i, value in enumerate(values):
+            self._stats[i] = value
+        self._stats_sequence[0] += 1
+
+    def stats(self) -> dict:
+        """
+        :return: the timing of the output process, keyed output_fps, output_jitter and so on
+        """
+        while True:
+            before = self._stats_sequence[0]
+            values = self._stats.tolist()
+            if not before & 1 and self._stats_sequence[0] == before:
+                return {'output_' + name: value for name, value in zip(STATS, values)}
+
+    def close(self) -> None:
+        for view in [self._stats_sequence, self._stats] + self._sequences + self._frames:
+            view.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+            self.owner = False
+
+
+def run_output(name: str, universe_count: int, lock, stopped, frame_rate: float, device_map: list = None,
+               loopback_devices: int = None) -> None:
+    """
+    The body of the output process: an OutputEngine driving the interfaces, fed from the
+    universes in shared memory at the start of every frame.
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    # Ctrl+C reaches the whole process group; the desk process decides when output stops.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    universes = SharedUniverses(universe_count, name, lock)
+    transport = LoopbackTransport(loopback_devices) if loopback_devices else None
+    manager = UniverseManager(universe_count, device_map, transport, discover=True)
+    engine = OutputEngine(manager, frame_rate)
+    manager.on_hotplug = engine.wake
+    # Nothing wakes the engine from the other process, so it polls the block once a frame while idle.
+    engine.idle_timeout = engine.period
+    sequences = [None] * universes.universe_count
+    next_stats = [0.0]
+
+    def pull(now):
+        for universe in range(universes.universe_count):
+            sequences[universe], frame = universes.read(universe, sequences[universe])
+            if frame is not None:
+                engine.publish(1, frame, universe)
+        if now >= next_stats[0]:
+            universes.write_stats(engine)
+            next_stats[0] = now + universes.stats_interval
+
+    engine.add_frame_callback(pull)
+    engine.start()
+    try:
+        stopped.wait()
+    finally:
+        engine.stop()
+        manager.close()
+        universes.close()
+
+
+class OutputProcess:
+    """
+    Runs the interfaces in a separate process reading a SharedUniverses block.
+
+    universes = SharedUniverses(universe_count)
+    output = OutputProcess(universes, 44)
+    output.start()
+    """
+    def __init__(self, universes: SharedUniverses, frame_rate: float = OutputEngine.max_frame_rate,
+                 device_map: list = None, loopback_devices: int = None):
+        """
+        :param device_map: (bus, address) of the interface of every universe, as for UniverseManager
+        :param loopback_devices: output to this many simulated interfaces instead of USB hardware
+        """
+        self.stopped = multiprocessing.Event()
+        self.process = multiprocessing.Process(
+            target=run_output, name="OutputProcess", daemon=True,
+            args=(universes.name, universes.universe_count, universes.lock, self.stopped, frame_rate, device_map,
+                  loopback_devices))
+
+    def start(self) -> None:
+        self.process.start()
+        logger.info("Output process %s started", self.process.pid)
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self.stopped.set()
+        if self.process.pid is None:
+            return
+        self.process.join(timeout)
+        if self.process.is_alive():
+            logger.warning("Output process did not stop, terminating it")
+            self.process.terminate()
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class StorageHandler:
+    batch_size = 64
+    flush_delay = 0.25
+
+    def __init__(self, path='storage.db', legacy_path='storage.json'):
+        self.path = path
+        self.lock = threading.RLock()
+        migrate = not os.path.exists(path) and os.path.exists(legacy_path)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS presets '
+                                    '(position INTEGER PRIMARY KEY, name TEXT NOT NULL, levels TEXT NOT NULL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS variables (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.presets = {}
+        self.variables = {}
+        self.pending_presets = {}
+        self.pending_variables = {}
+        self.flush_timer = None
+        self.signature = None
+        self.cache_hits = self.cache_misses = 0
+        if migrate:
+            self.migrate_json(legacy_path)
+        self.read_storage()
+
+    def file_signature(self):
+        # With WAL journaling another writer's commits land in the -wal file first, so watch both.
+        signature = []
+        for path in (self.path, self.path + '-wal'):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def check_cache(self):
+        with self.lock:
+            if self.file_signature() == self.signature:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+                self.read_storage()
+
+    def cache_stats(self):
+        return {'hits': self.cache_hits, 'misses': self.cache_misses}
+
+    def migrate_json(self, legacy_path):
+        with open(legacy_path, 'r') as storage_file:
+            storage_dict = json.loads(storage_file.read())
+        for name, (position, levels) in storage_dict.pop('presets', {}).items():
+            self.pending_presets[position] = ('' if name == str(position) else name, levels)
+        self.pending_variables.update(storage_dict)
+        self.flush()
+        os.replace(legacy_path, legacy_path + '.migrated')
+        logger.info("Migrated %s to %s", legacy_path, self.path)
+
+    def read_storage(self):
+        with self.lock:
+            self.flush()
+            self.presets = {position: (name, json.loads(levels)) for position, name, levels in
+                            self.connection.execute('SELECT position, name, levels FROM presets')}
+            self.variables = {name: json.loads(value) for name, value in
+                              self.connection.execute('SELECT name, value FROM variables')}
+            self.signature = self.file_signature()
+
+    def flush(self):
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if not self.pending_presets and not self.pending_variables:
+                return
+            # One transaction per batch, so a crash leaves either all of the batch or none of it on disk.
+            with self.connection:
+                for position, preset in self.pending_presets.items():
+                    if preset is None:
+                        self.connection.execute('DELETE FROM presets WHERE position = ?', (position,))
+                    else:
+                        self.connection.execute('INSERT OR REPLACE INTO presets (position, name, levels) '
+                                                'VALUES (?, ?, ?)', (position, preset[0], json.dumps(preset[1])))
+                for name, value in self.pending_variables.items():
+                    self.connection.execute('INSERT OR REPLACE INTO variables (name, value) VALUES (?, ?)',
+                                            (name, json.dumps(value)))
+            self.pending_presets = {}
+            self.pending_variables = {}
+            if self.signature is not None:
+                # Our own commit changed the file, which must not count as an outside edit.
+                self.signature = self.file_signature()
+
+    def queue_write(self):
+        if len(self.pending_presets) + len(self.pending_variables) >= self.batch_size:
+            self.flush()
+            return
+        # Debounce: a burst of writes is committed once, shortly after the last of them.
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+        self.flush_timer = threading.Timer(self.flush_delay, self.flush)
+        self.flush_timer.daemon = True
+        self.flush_timer.start()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def get_storage(self):
+        self.check_cache()
+        storage_dict = dict(self.variables)
+        storage_dict['presets'] = self.get_preset_dict()
+        storage_dict.setdefault('keys', [])
+        return storage_dict
+
+    def read_variable(self, variable):
+        self.check_cache()
+        return self.variables.get(variable, None)
+
+    def write_variable(self, variable, value):
+        # Keep a copy, so a caller editing its list or dict in place still differs from what is stored.
+        value = json.loads(json.dumps(value))
+        with self.lock:
+            if self.variables.get(variable) != value or variable not in self.variables:
+                self.variables[variable] = value
+                self.pending_variables[variable] = value
+                self.queue_write()
+
+    def write_preset(self, position, name, levels):
+        with self.lock:
+            preset = (name, list(levels))
+            if self.presets.get(position) != preset:
+                self.presets[position] = preset
+                self.pending_presets[position] = preset
+                self.queue_write()
+
+    def delete_preset(self, position):
+        with self.lock:
+            if self.presets.pop(position, None) is not None:
+                self.pending_presets[position] = None
+                self.queue_write()
+
+    def write_preset_dict(self, preset_dict):
+        with self.lock:
+            positions = set()
+            for name, (position, levels) in preset_dict.items():
+                positions.add(position)
+                self.write_preset(position, '' if name == str(position) else name, levels)
+            for position in set(self.presets) - positions:
+                self.delete_preset(position)
+
+    def get_preset_dict(self):
+        self.check_cache()
+        return {name or str(position): (position, levels) for position, (name, levels) in self.presets.items()}
+
+    def get_lighting_keys(self):
+        self.check_cache()
+        return self.variables.get('keys', [])
+
+    def write_lighting_keys(self, keys_dict):
+        self.write_variable('keys', keys_dict)
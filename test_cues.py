@@ -0,0 +1,82 @@
+from cues import Cue, Playback, compile_chase, compile_cue_list
+from patch import Patch
+
+PRESETS = [[100, 0], [200, 50], [0, 0]]
+
+
+def test_follow_cues_chain_into_one_timeline_per_go():
+    cues = [Cue(0, fade_in=2.0, follow=3.0), Cue(1), Cue(2)]
+    timelines = compile_cue_list(cues, PRESETS)
+    assert len(timelines) == 2
+    first, second = timelines
+    assert first.frame(0.0) == bytes([0, 0])
+    assert first.frame(1.0) == bytes([50, 0])
+    assert first.frame(2.0) == bytes([100, 0])
+    assert first.frame(3.0) == bytes([200, 50])
+    # The next GO fades from where the last one ended.
+    assert second.initial == bytes([200, 50])
+    assert second.frame(0.0) == bytes([0, 0])
+
+
+def test_wait_delays_the_fade():
+    timeline = compile_cue_list([Cue(0, fade_in=1.0, wait=2.0)], PRESETS)[0]
+    assert timeline.frame(1.9) == bytes([0, 0])
+    assert timeline.frame(2.5) == bytes([50, 0])
+
+
+def test_chase_loops_in_time_with_the_tempo():
+    timeline = compile_chase([0, 1], PRESETS, bpm=60)
+    assert timeline.length == 2.0
+    assert [timeline.frame(t) for t in (0.5, 1.5, 2.5)] == [bytes([100, 0]), bytes([200, 50]), bytes([100, 0])]
+
+
+def test_go_back_and_release():
+    playback = Playback(Patch.dimmers(2))
+    playback.load_cue_list([Cue(0, follow=1.0), Cue(1), Cue(2)], PRESETS)
+    assert not playback.active and playback.frame(0.0) is None
+    playback.go(10.0)
+    assert playback.cue_index == 0
+    assert playback.frame(11.5) == bytes([200, 50])
+    playback.go(20.0)
+    playback.go(21.0)
+    assert playback.cue_index == 2
+    playback.back(30.0)
+    assert playback.cue_index == 0 and playback.position == (0, 30.0)
+    playback.release()
+    assert not playback.active and playback.cue_index is None
+
+
+def test_recompiling_keeps_the_running_cue():
+    playback = Playback(Patch.dimmers(2))
+    cues = [Cue(0), Cue(1)]
+    playback.load_cue_list(cues, PRESETS)
+    playback.go(10.0)
+    playback.go(11.0)
+    playback.load_cue_list(cues, [[100, 0], [30, 40], [0, 0]])
+    assert playback.position == (1, 11.0)
+    assert playback.frame(12.0) == bytes([30, 40])
+    # A shorter cue list releases a position that no longer exists.
+    playback.load_cue_list(cues[:1], PRESETS)
+    assert not playback.active
+
+
+def test_recompiling_keeps_the_chase_until_it_is_released():
+    playback = Playback(Patch.dimmers(2))
+    playback.load_cue_list([Cue(2)], PRESETS)
+    playback.load_chase([0, 1], PRESETS, 60, 0.0, 5.0)
+    assert playback.cue_index is None
+    playback.load_cue_list([Cue(2)], [[10, 0], [20, 0], [0, 0]])
+    assert playback.frame(6.5) == bytes([20, 0])
+    playback.release()
+    assert playback.chase is None and not playback.active
+    playback.go(0.0)
+    assert playback.frame(0.0) == bytes([0, 0])
+
+
+def test_tempo_change_continues_from_the_nearest_step():
+    playback = Playback(Patch.dimmers(2))
+    assert not playback.set_chase_tempo(120, 0.0)
+    playback.load_chase([0, 1], PRESETS, 60, 0.0, 0.0)
+    assert playback.set_chase_tempo(120, 3.0)
+    assert playback.frame(3.1) == bytes([200, 50])
+    assert playback.frame(3.6) == bytes([100, 0])
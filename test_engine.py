@@ -0,0 +1,96 @@
+import time
+
+from engine import OutputEngine
+from loopback import LoopbackTransport
+from output import UniverseManager
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def run_engine(universe_count=1, frame_rate=44):
+    transport = LoopbackTransport(universe_count)
+    manager = UniverseManager(universe_count, transport=transport)
+    engine = OutputEngine(manager, frame_rate)
+    engine.start()
+    return transport, manager, engine
+
+
+def stop_engine(manager, engine):
+    engine.stop()
+    manager.close()
+
+
+def test_published_frames_reach_every_universe():
+    transport, manager, engine = run_engine(2)
+    try:
+        engine.publish(1, bytes([10, 20, 30]), 0)
+        engine.publish(5, bytes([40]), 1)
+        assert wait_for(lambda: transport.devices[0].universe[:3] == bytes([10, 20, 30])
+                        and transport.devices[1].universe[4] == 40)
+        engine.publish(2, bytes([99]), 0)
+        assert wait_for(lambda: transport.devices[0].universe[:3] == bytes([10, 99, 30]))
+    finally:
+        stop_engine(manager, engine)
+
+
+def test_stats_with_sparse_publishing():
+    transport, manager, engine = run_engine()
+    try:
+        started = time.perf_counter()
+        value = 0
+        while time.perf_counter() - started < 1.0:
+            value = value % 255 + 1
+            engine.publish(1, bytes([value]))
+            time.sleep(1 / 30)
+        stats = engine.stats()
+        assert wait_for(lambda: transport.devices[0].universe[0] == value)
+    finally:
+        stop_engine(manager, engine)
+    assert stats['frames_sent'] >= 20
+    assert 20 < stats['fps'] <= 45
+    assert 0 <= stats['jitter'] < engine.period
+
+
+def test_frame_rate_is_capped():
+    transport, manager, engine = run_engine(frame_rate=20)
+    try:
+        started = time.perf_counter()
+        while time.perf_counter() - started < 1.0:
+            engine.publish(1, bytes([int(time.perf_counter() * 1000) % 256]))
+            time.sleep(0.001)
+        stats = engine.stats()
+    finally:
+        stop_engine(manager, engine)
+    assert stats['frames_sent'] <= 25
+    assert stats['fps'] <= 21
+
+
+def test_discovered_interface_recovers_from_a_transfer_failure(monkeypatch):
+    # No second scan during the test: the interface has to come back by itself.
+    monkeypatch.setattr(UniverseManager, 'hotplug_interval', 60.0)
+    transport = LoopbackTransport(1)
+    manager = UniverseManager(1, transport=transport, discover=True)
+    engine = OutputEngine(manager, 44)
+    manager.on_hotplug = engine.wake
+    engine.start()
+    device = transport.devices[0]
+    try:
+        engine.publish(1, bytes([10]))
+        assert wait_for(lambda: device.universe[0] == 10)
+        device.failure_rate = 1.0
+        engine.publish(1, bytes([20]))
+        assert wait_for(lambda: device.failures > 0)
+        device.failure_rate = 0.0
+        assert wait_for(lambda: device.universe[0] == 20, timeout=1.0)
+        stats = manager.stats()
+    finally:
+        stop_engine(manager, engine)
+    assert stats['reconnects'] >= 1
+    assert stats['universes'][0]['last_reconnect_latency'] is not None
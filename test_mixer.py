@@ -0,0 +1,64 @@
+from cues import Cue, Playback, PlaybackMixer
+from engine import htp_ltp_merge
+from patch import Fixture, Patch
+
+# Two RGB pars with a dimmer: intensity is HTP, red, green, blue and strobe are LTP.
+PATCH = Patch([Fixture('rgb par with dimmer', 'Left', 0, 1), Fixture('rgb par with dimmer', 'Right', 0, 6)])
+DESK = bytes([50, 10, 20, 30, 0, 60, 1, 2, 3, 0])
+PRESETS = [[200, 150, 0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 80, 90, 0, 0, 0]]
+
+
+def mask(*channels, size=len(DESK)):
+    return int.from_bytes(bytes(255 if channel in channels else 0 for channel in range(size)), 'big')
+
+
+def test_htp_ltp_merge():
+    levels = bytes([10, 20, 30, 40])
+    values = bytes([50, 5, 0, 99])
+    assert htp_ltp_merge(levels, values, mask(0, 2, size=4), mask(1, size=4)) == bytes([50, 5, 30, 40])
+    assert htp_ltp_merge(levels, values, 0, 0) == levels
+
+
+def test_ltp_mask_covers_the_fixtures_a_frame_uses():
+    assert PATCH.ltp_mask([PRESETS[0]]) == mask(1, 2, 3, 4)
+    assert PATCH.ltp_mask(PRESETS) == mask(1, 2, 3, 4, 6, 7, 8, 9)
+    assert PATCH.ltp_mask([bytes(10)]) == 0
+
+
+def raised_mixer(cue_list=()):
+    mixer = PlaybackMixer(PATCH, 2)
+    mixer.assign(0, preset=0)
+    mixer.assign(1, preset=1)
+    mixer.compile(list(cue_list), PRESETS)
+    return mixer
+
+
+def test_raised_faders_merge_htp_and_snap_ltp():
+    mixer = raised_mixer()
+    assert not mixer and mixer.apply(DESK, 0.0) == DESK
+    mixer.set_level(0, 128, 0.0)
+    # Intensity is the higher of the desk and the scaled preset, the colour snaps to the preset.
+    assert mixer.apply(DESK, 0.0) == bytes([100, 150, 0, 0, 0, 60, 1, 2, 3, 0])
+    mixer.set_level(1, 255, 0.0)
+    assert mixer.apply(DESK, 0.0) == bytes([100, 150, 0, 0, 0, 80, 90, 0, 0, 0])
+    mixer.set_level(0, 0, 0.0)
+    assert mixer.apply(DESK, 0.0) == bytes([50, 10, 20, 30, 0, 80, 90, 0, 0, 0])
+
+
+def test_a_cue_fader_plays_from_when_it_is_raised():
+    mixer = PlaybackMixer(PATCH, 1)
+    mixer.assign(0, cue=0)
+    mixer.compile([Cue(0, fade_in=2.0)], PRESETS)
+    assert mixer.faders[0].describe() == 'Cue 1'
+    mixer.set_level(0, 255, 10.0)
+    assert mixer.animated
+    assert mixer.apply(bytes(10), 11.0)[:2] == bytes([100, 75])
+    assert mixer.apply(bytes(10), 12.0)[:2] == bytes([200, 150])
+
+
+def test_cue_playback_merges_like_a_raised_fader():
+    playback = Playback(PATCH)
+    playback.load_cue_list([Cue(0)], PRESETS)
+    assert playback.merge(DESK, 0.0) == DESK
+    playback.go(0.0)
+    assert playback.merge(DESK, 0.0) == bytes([200, 150, 0, 0, 0, 60, 1, 2, 3, 0])
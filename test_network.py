@@ -0,0 +1,115 @@
+import struct
+
+from network import (ACN_IDENTIFIER, ARTNET_HEADER, ARTNET_OP_DMX, NetworkServer, osc_level, parse_artnet,
+                     parse_osc, parse_sacn)
+from patch import Patch
+
+
+def artnet_packet(universe, data, opcode=ARTNET_OP_DMX):
+    return ARTNET_HEADER + struct.pack('<HHBBH', opcode, 14, 0, 0, universe) + struct.pack('>H', len(data)) + data
+
+
+def sacn_packet(universe, data, options=0, start_code=0):
+    packet = bytearray(126)
+    packet[4:16] = ACN_IDENTIFIER
+    struct.pack_into('>I', packet, 18, 0x4)
+    struct.pack_into('>I', packet, 40, 0x2)
+    packet[112] = options
+    struct.pack_into('>H', packet, 113, universe)
+    struct.pack_into('>H', packet, 123, len(data) + 1)
+    packet[125] = start_code
+    return bytes(packet) + data
+
+
+def osc_string(value):
+    data = value.encode('ascii') + b'\x00'
+    return data + b'\x00' * (-len(data) % 4)
+
+
+def osc_message(address, *arguments):
+    tags = ','
+    data = b''
+    for argument in arguments:
+        if isinstance(argument, float):
+            tags += 'f'
+            data += struct.pack('>f', argument)
+        elif isinstance(argument, int):
+            tags += 'i'
+            data += struct.pack('>i', argument)
+        else:
+            tags += 's'
+            data += osc_string(argument)
+    return osc_string(address) + osc_string(tags) + data
+
+
+def test_artnet_dmx_packets():
+    assert parse_artnet(artnet_packet(0x8003, bytes([1, 2, 3]))) == (3, bytes([1, 2, 3]))
+    assert parse_artnet(artnet_packet(0, bytes(2), opcode=0x2000)) is None
+    assert parse_artnet(b'Art-Net\x00') is None
+
+
+def test_sacn_data_packets():
+    assert parse_sacn(sacn_packet(1, bytes([10, 20]))) == (0, bytes([10, 20]))
+    assert parse_sacn(sacn_packet(2, bytes([10]), options=0x80)) is None
+    assert parse_sacn(sacn_packet(2, bytes([10]), start_code=0xdd)) is None
+    assert parse_sacn(bytes(125)) is None
+
+
+def test_osc_messages_and_bundles():
+    message = osc_message('/channel/3', 200)
+    assert parse_osc(message) == [('/channel/3', [200])]
+    assert parse_osc(osc_string('/go')) == [('/go', [])]
+    other = osc_message('/preset', 2, 1.5, 'x')
+    bundle = (osc_string('#bundle') + bytes(8) + struct.pack('>i', len(message)) + message +
+              struct.pack('>i', len(other)) + other)
+    assert parse_osc(bundle) == [('/channel/3', [200]), ('/preset', [2, 1.5, 'x'])]
+
+
+def test_osc_levels():
+    assert [osc_level(value) for value in (0.5, 1.0, 2.0, 300, -4, 128)] == [128, 255, 255, 255, 0, 128]
+
+
+class Output:
+    class universes:
+        universe_count = 1
+
+    def add_source(self, source):
+        self.source = source
+
+    def wake(self):
+        pass
+
+
+class Core:
+    def __init__(self):
+        self.output = Output()
+        self.patch = Patch.dimmers(4)
+        self.master = 255
+        self.blackout = False
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *arguments: self.calls.append((name,) + arguments)
+
+
+def test_osc_commands_reach_the_desk():
+    core = Core()
+    server = NetworkServer(core)
+    for address, arguments in [('/channel/3', [0.5]), ('/channel', [4, 10]), ('/master', [1.0]),
+                               ('/submaster/front/', [0]), ('/playback/2', [255]), ('/blackout', []),
+                               ('/go', []), ('/effect/stop', []), ('/nothing', [1])]:
+        server.handle_osc(osc_message(address, *arguments))
+    assert core.calls == [('set_channel', 3, 128), ('set_channel', 4, 10), ('set_grand_master', 255),
+                          ('set_submaster', 'front', 0), ('set_playback_level', 1, 255), ('set_blackout', True),
+                          ('go',), ('stop_effect', None)]
+
+
+def test_network_frames_follow_the_master_and_time_out():
+    core = Core()
+    server = NetworkServer(core)
+    server.handle_artnet(artnet_packet(0, bytes([255, 100])))
+    server.handle_artnet(artnet_packet(5, bytes([255])))
+    core.master = 128
+    received = server.input.frames[0][0]
+    assert server.input.render(received) == {0: bytes([128, 50])}
+    assert server.input.render(received + server.input.timeout) == {}
@@ -0,0 +1,92 @@
+import pytest
+
+from network import NetworkInput
+from patch import Attribute, Fixture, Patch
+
+
+def stage_patch():
+    return Patch([Fixture('moving head', 'Mover', 1, 10, invert=['pan', 'pan fine']),
+                  Fixture('dimmer', 'Front', 0, 1, curve='square')])
+
+
+def test_render_gathers_desk_levels_into_universes():
+    patch = stage_patch()
+    levels = bytes([0, 255, 10, 0, 0, 200, 1, 2, 3, 255])
+    frames = patch.render(levels, master=128)
+    assert sorted(frames) == [0, 1] and all(len(frame) == 512 for frame in frames.values())
+    # Pan and its fine byte are inverted together, LTP tilt and colour ignore the master.
+    assert frames[1][9:18] == bytes([255, 0, 10, 0, 0, 100, 1, 2, 3])
+    # The dimmer's curve applies after the master.
+    assert frames[0][0] == round((128 / 255) ** 2 * 255)
+    assert frames[0][1:] == bytes(511) and frames[1][:9] == bytes(9)
+
+
+def test_tables_are_rebuilt_when_sub_masters_or_curves_change():
+    patch = Patch.dimmers(2)
+    assert patch.render(bytes([200, 200]))[0][:2] == bytes([200, 200])
+    patch.set_scales(bytes([255, 0]))
+    assert patch.render(bytes([200, 200]))[0][:2] == bytes([200, 0])
+    patch.set_curve(0, 'square')
+    assert patch.render(bytes([255, 0]))[0][0] == 255
+    assert patch.render_channels(bytes([128, 0]), 255, 0, 5) == [(0, 1, 64), (0, 2, 0)]
+    with pytest.raises(ValueError):
+        patch.set_curve(0, 'no such curve')
+
+
+def test_custom_profiles_and_curves_survive_a_round_trip():
+    profiles = {'fogger': [{'name': 'output', 'htp': True, 'curve': 'half'}]}
+    curves = {'half': [value // 2 for value in range(256)]}
+    patch = Patch.from_dicts([{'fixture_type': 'fogger', 'name': 'Fog', 'universe': 0, 'address': 5}],
+                             profiles, curves)
+    assert patch.render(bytes([200]))[0][4] == 100
+    assert Patch.from_dicts(patch.to_dicts(), profiles, curves).render(bytes([200])) == patch.render(bytes([200]))
+    assert patch.label(0) == 'Fog'
+
+
+def test_invalid_patches_are_rejected():
+    with pytest.raises(ValueError):
+        Patch([Fixture('dimmer', 'A', 0, 1), Fixture('rgb par', 'B', 0, 1)])
+    with pytest.raises(ValueError):
+        Patch([Fixture('rgb par', 'Edge', 0, 511)])
+    with pytest.raises(ValueError):
+        Fixture('smoke machine', 'Fog', 0, 1)
+    with pytest.raises(ValueError):
+        Patch([], curves={'short': [0] * 10})
+
+
+def test_groups_follow_the_fixtures():
+    patch = Patch([Fixture('rgb par', 'Left', 0, 1), Fixture('rgb par', 'Right', 0, 4)])
+    assert patch.groups(range(2, 6)) == [[2, 3], [4, 5]]
+    assert patch.label(4) == 'Right green'
+    assert Attribute('pan', invert=True).table()[0] == 255
+
+
+class Universes:
+    universe_count = 2
+
+
+class Output:
+    universes = Universes()
+
+    def wake(self):
+        pass
+
+
+class Core:
+    def __init__(self, patch):
+        self.output = Output()
+        self.patch = patch
+        self.master = 128
+
+
+def test_network_input_keeps_ltp_slots_off_the_master():
+    network_input = NetworkInput(Core(stage_patch()))
+    network_input.receive(1, bytes(9) + bytes([40, 0, 10, 0, 0, 200]))
+    network_input.receive(0, bytes([200]))
+    received = max(received for received, _ in network_input.frames.values())
+    frames = network_input.render(received)
+    assert frames[0] == bytes([100])
+    frame, ltp = frames[1]
+    assert frame[9:15] == bytes([40, 0, 10, 0, 0, 100])
+    mask = ltp.to_bytes(len(frame), 'big')
+    assert mask[9:15] == bytes([255, 255, 255, 255, 255, 0]) and not any(mask[:9])
@@ -0,0 +1,32 @@
+from presets import PresetIndex, PreviewCache, preview_columns
+
+
+def test_search_matches_word_prefixes_and_numbers():
+    index = PresetIndex(['Warm wash', '', 'Cold wash', 'Blue chase', 'Warm spot'], present=[0, 2, 3, 4])
+    assert index.search('') == [0, 2, 3, 4]
+    assert index.search('wa') == [0, 2, 4]
+    assert index.search('WARM was') == [0]
+    assert index.search('spot warm') == [4]
+    assert index.search('3') == [3]
+    assert index.search('ash') == []
+    assert PresetIndex(['', 'Red']).search('1') == [1]
+
+
+def test_preview_columns_keep_the_highest_level():
+    assert preview_columns([0, 10, 200, 0, 5, 7], 3) == [10, 200, 7]
+    assert preview_columns([50, 100], 4) == [50, 50, 100, 100]
+    assert preview_columns([], 2) == [0, 0]
+
+
+def test_preview_cache_evicts_the_least_recently_used():
+    rendered = []
+    cache = PreviewCache(lambda key: rendered.append(key) or key * 2, capacity=2)
+    assert cache.get(1) == 2 and cache.get(2) == 4
+    cache.get(1)
+    cache.get(3)
+    assert list(cache.previews) == [1, 3]
+    cache.get(2)
+    cache.discard(3)
+    assert rendered == [1, 2, 3, 2] and list(cache.previews) == [2]
+    cache.clear()
+    assert not cache.previews
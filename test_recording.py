@@ -0,0 +1,47 @@
+from loopback import LoopbackTransport
+from output import UniverseManager
+from recording import Player, Recorder, changed_runs
+from test_engine import wait_for
+
+
+def test_changed_runs_merge_close_changes():
+    old = bytes(20)
+    new = bytearray(20)
+    new[2] = new[5] = new[18] = 1
+    assert changed_runs(old, bytes(new), 4) == [[2, 6], [18, 19]]
+
+
+def test_round_trip_keeps_one_frame_per_flush(tmp_path):
+    path = str(tmp_path / 'show.udmx')
+    manager = UniverseManager(2, transport=LoopbackTransport(2))
+    manager.recorder = Recorder(path, compress=True, flush_interval=0.01)
+    for i in range(50):
+        manager.write_frame(0, 1, bytes([i, 255 - i]))
+        manager.write_frame(1, 3, bytes([i * 2]))
+        manager.flush()
+    manager.recorder.close()
+    manager.close()
+
+    player = Player(path)
+    try:
+        frames = list(player.frames())
+    finally:
+        player.close()
+    assert len(frames) == 50
+    times = [frame_time for frame_time, _ in frames]
+    assert times == sorted(times)
+    # The first frame holds both universes whole, later ones only what changed.
+    assert [universe for universe, _, _ in frames[0][1]] == [0, 1]
+    assert frames[0][1][0][2][:2] == bytes([0, 255])
+    assert frames[-1][1] == [(0, 0, bytes([49, 206])), (1, 2, bytes([98]))]
+
+    transport = LoopbackTransport(2)
+    replay = UniverseManager(2, transport=transport)
+    player = Player(path)
+    try:
+        assert player.play(replay, speed=100.0) == 50
+        assert wait_for(lambda: transport.devices[0].universe[:2] == bytes([49, 206])
+                        and transport.devices[1].universe[2] == 98)
+    finally:
+        player.close()
+        replay.close()
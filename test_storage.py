@@ -0,0 +1,108 @@
+import json
+import os
+import sqlite3
+import time
+
+from storage import StorageHandler
+
+
+def open_storage(tmp_path):
+    return StorageHandler(str(tmp_path / 'storage.db'), str(tmp_path / 'storage.json'))
+
+
+def test_json_storage_is_migrated_once(tmp_path):
+    legacy = tmp_path / 'storage.json'
+    legacy.write_text(json.dumps({'presets': {'Warm': [0, [255, 128]], '1': [1, [10]]},
+                                  'keys': ['a', 'b'], 'channel_count': 48}))
+    storage = open_storage(tmp_path)
+    try:
+        assert storage.get_preset_dict() == {'Warm': (0, [255, 128]), '1': (1, [10])}
+        assert storage.read_variable('channel_count') == 48
+        assert storage.get_lighting_keys() == ['a', 'b']
+    finally:
+        storage.close()
+    assert not legacy.exists() and os.path.exists(str(legacy) + '.migrated')
+    storage = open_storage(tmp_path)
+    try:
+        assert storage.presets[1] == ('', [10])
+    finally:
+        storage.close()
+
+
+def test_presets_are_upserted_and_deleted(tmp_path):
+    storage = open_storage(tmp_path)
+    storage.write_preset_dict({'Warm': (0, [255, 128]), 'Cold': (1, [0, 0, 255])})
+    storage.write_preset_dict({'Warm': (0, [200, 128])})
+    storage.write_variable('frame_rate', 30)
+    storage.close()
+    storage = open_storage(tmp_path)
+    try:
+        assert storage.get_preset_dict() == {'Warm': (0, [200, 128])}
+        assert storage.read_variable('frame_rate') == 30
+    finally:
+        storage.close()
+
+
+def stored_variables(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / 'storage.db'))
+    try:
+        return dict(connection.execute('SELECT name, value FROM variables'))
+    finally:
+        connection.close()
+
+
+def test_a_burst_of_writes_is_committed_once_after_the_last(tmp_path, monkeypatch):
+    monkeypatch.setattr(StorageHandler, 'flush_delay', 0.05)
+    storage = open_storage(tmp_path)
+    try:
+        for level in range(10):
+            storage.write_variable('level', level)
+        assert storage.read_variable('level') == 9
+        assert stored_variables(tmp_path) == {}
+        time.sleep(0.2)
+        assert stored_variables(tmp_path) == {'level': '9'}
+    finally:
+        storage.close()
+
+
+def test_a_full_batch_is_committed_at_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(StorageHandler, 'batch_size', 4)
+    storage = open_storage(tmp_path)
+    try:
+        for i in range(4):
+            storage.write_variable('variable {}'.format(i), i)
+        assert len(stored_variables(tmp_path)) == 4
+    finally:
+        storage.close()
+
+
+def test_outside_edits_invalidate_the_cache(tmp_path):
+    storage = open_storage(tmp_path)
+    other = open_storage(tmp_path)
+    try:
+        storage.write_variable('frame_rate', 44)
+        storage.flush()
+        misses = storage.cache_stats()['misses']
+        assert storage.read_variable('frame_rate') == 44
+        assert storage.cache_stats()['misses'] == misses
+        other.write_variable('frame_rate', 30)
+        other.flush()
+        assert storage.read_variable('frame_rate') == 30
+        assert storage.cache_stats()['misses'] == misses + 1
+    finally:
+        other.close()
+        storage.close()
+
+
+def test_values_edited_in_place_are_written_again(tmp_path):
+    storage = open_storage(tmp_path)
+    keys = ['a']
+    storage.write_variable('keys', keys)
+    keys.append('b')
+    storage.write_variable('keys', keys)
+    storage.close()
+    storage = open_storage(tmp_path)
+    try:
+        assert storage.get_lighting_keys() == ['a', 'b']
+    finally:
+        storage.close()